@@ -2,12 +2,32 @@ from datetime import datetime, timedelta
 import subprocess
 import sys
 import os
+import re
 import json
+import csv
+import uuid
+import atexit
+import sqlite3
+import hashlib
+import queue
+import itertools
 import time
 import random
-import traceback
+import signal
+import argparse
+import logging
+import logging.handlers
+import threading
+import multiprocessing
+from multiprocessing.managers import BaseManager
 import psutil
 import requests
+from requests.adapters import HTTPAdapter
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -16,10 +36,11 @@ from selenium.common.exceptions import (
     NoSuchElementException, 
     TimeoutException, 
     StaleElementReferenceException,
+    ElementNotInteractableException,
+    ElementClickInterceptedException,
     InvalidSessionIdException,
     WebDriverException
 )
-import openpyxl
 from openpyxl import Workbook
 
 # ------------------ AUTO-INSTALL REQUIRED MODULES ------------------
@@ -48,6 +69,21 @@ MAIN_URL = "https://onetalk.alibaba.com/message/weblitePWA.htm?isGray=1&from=men
 BASE_URL = "https://alibaba.com/"
 RAG_URL = "https://609f-34-59-106-222.ngrok-free.app/search-embed"  # Replace with your real endpoint
 USE_AI = True  # Toggle AI replies
+RAG_CONNECT_TIMEOUT = 3  # Seconds to establish a connection to RAG_URL
+RAG_READ_TIMEOUT = 10  # Seconds to wait for the RAG answer once connected
+RAG_MAX_RETRIES = 2  # Extra attempts after a failed RAG request
+RAG_RETRY_BACKOFF = 0.5  # Base retry delay in seconds, doubled per attempt and jittered
+RAG_POOL_SIZE = 4  # Keep-alive connections kept open to RAG_URL
+RAG_BREAKER_THRESHOLD = 3  # Consecutive failed requests that open the circuit
+RAG_BREAKER_COOLDOWN = 30  # Seconds between background probes while the circuit is open
+RAG_STATS_LOG_EVERY = 25  # Log RAG client counters every N requests
+RAG_BATCH_URL = None  # Batch endpoint taking {"items": [{"query", "image"}]} and answering {"results": [...]}; None sends parallel single requests
+RAG_BATCH_SIZE = 8  # Queries per batch request
+RAG_PREFETCH = True  # Start RAG for queued conversations from their inbox preview, before they are opened
+RAG_PREFETCH_TTL = 300  # Seconds a prefetched answer waits for its conversation before it is dropped
+WEBHOOK_URL = "https://n8n.ecowoodies.com/webhook/alibabadumping"  # Replace with actual URL
+WEBHOOK_CONNECT_TIMEOUT = 3
+WEBHOOK_READ_TIMEOUT = 10
 
 REPLIES = [
     "Hello! Thanks for your inquiry. Our team will assist you shortly.",
@@ -66,24 +102,264 @@ else:
 COOKIES_FILE = os.path.join(BASE_DIR, "cookies.json")
 ERROR_LOG = os.path.join(BASE_DIR, "error.log")
 ACTIVITY_LOG = os.path.join(BASE_DIR, "activity.log")
+LOG_LEVEL = "INFO"  # DEBUG, INFO, WARNING or ERROR; activity lines starting with ⚠️ are WARNING
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate a log file once it grows past this size
+LOG_ROTATE_INTERVAL = 24 * 3600  # ...or once it has been written to for this many seconds
+LOG_BACKUP_COUNT = 7  # Rotated files kept per log
+LOG_JSONL = False  # Write structured JSON lines instead of plain text
+LOG_TO_CONSOLE = True
+METRICS_PORT = 9108  # Local Prometheus-text endpoint (http://127.0.0.1:PORT/metrics); None disables it
+METRICS_DUMP_FILE = os.path.join(BASE_DIR, "metrics.jsonl")
+METRICS_DUMP_INTERVAL = 60  # Seconds between JSONL metric dumps; None disables them
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_SAMPLE_SIZE = 1000  # Recent observations kept per histogram for p50/p95 in the dumps
+REPLY_CACHE_FILE = os.path.join(BASE_DIR, "reply_cache.json")
+OUTBOX_DB = os.path.join(BASE_DIR, "outbox.db")
+INQUIRY_LEDGER_DB = os.path.join(BASE_DIR, "inquiries.db")
+TRACE_FILE = os.path.join(BASE_DIR, "traces.jsonl")  # Per-message production traces, replayed offline by bench/replay.py
+TRACE_RECORDING = False  # Traces hold buyer messages and profiles; keep the file private
+PROCESSED_INDEX_FILE = os.path.join(BASE_DIR, "processed_index.jsonl")
+
+REPLY_CACHE_MAX_ENTRIES = 2000  # LRU size cap of the reply cache
+REPLY_CACHE_TTL = 7 * 24 * 3600  # Seconds a cached reply stays valid
+REPLY_CACHE_SAVE_INTERVAL = 60  # Write the cache to disk at most this often
+REPLY_CACHE_STATS_LOG_EVERY = 25  # Log cache hit/miss stats every N lookups
+IMAGE_FETCH_TIMEOUT = 10  # Seconds to download a message image for fingerprinting
+IMAGE_FINGERPRINT_MEMO_SIZE = 500  # Remembered img_url -> fingerprint pairs
+IO_POOL_SIZE = 4  # Threads that run RAG calls and image fetches while the driver thread keeps working
+
+OUTBOX_BATCH_SIZE = 20  # Webhook deliveries attempted per worker pass
+OUTBOX_POLL_INTERVAL = 5  # Seconds the delivery worker sleeps when nothing is due
+OUTBOX_RETRY_BACKOFF = 5  # Base retry delay in seconds, doubled per failed attempt
+OUTBOX_MAX_BACKOFF = 900  # Upper bound on the retry delay
+OUTBOX_RETENTION = 7 * 24 * 3600  # Seconds delivered entries are kept for idempotency checks
+EXPORT_CHUNK_SIZE = 500  # Ledger rows fetched per round trip while exporting
+
+PROCESSED_INDEX_RETENTION = 30 * 24 * 3600  # Seconds a handled message is remembered
+PROCESSED_ROW_TTL = 15 * 60  # Seconds an unchanged inbox row without a message id is skipped unopened
+PROCESSED_INDEX_COMPACT_SLACK = 1000  # Extra log lines tolerated before the index file is compacted
+PROCESSED_INDEX_COMPACT_INTERVAL = 24 * 3600  # ...and compacted at least this often, dropping entries past retention
+THREAD_SCAN_LIMIT = 20  # Most messages read from a thread per visit, newest first
+OWN_MESSAGE_EXPINFO = None  # (data-expinfo key, value) that marks messages we sent; None while unknown, then only the newest message is read without a cursor
 
 CHROME_PID = None
+CHROME_PROFILE_DIR = None  # Persistent Chrome user-data-dir (e.g. os.path.join(BASE_DIR, "chrome-profile")); None uses a throwaway profile
+WARM_STANDBY = False  # Keep a second Chrome running for near-instant session recovery, at the cost of its memory
+LIGHTWEIGHT_CHROME_ARGS = [  # Background services the headless browser does not need
+    "--mute-audio",
+    "--no-first-run",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync"
+]
+BLOCK_RESOURCES = True  # Block heavy resource types and tracker domains through CDP Network.setBlockedURLs
+BLOCKED_RESOURCE_PATTERNS = [  # Extractors read attributes (e.g. an image's src), never the loaded resource
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.mp3",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp"
+]
+BLOCKED_DOMAINS = [  # Analytics and monitoring beacons, blocked with all subdomains
+    "mmstat.com",
+    "arms-retcode.aliyuncs.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "hotjar.com"
+]
+BLOCK_ALLOWLIST = [  # URL patterns that are never blocked, e.g. product/message images on the CDN
+    "*://*.alicdn.com/kf/*"
+]
 MAX_SESSION_RECOVERY_ATTEMPTS = 3
 SESSION_CHECK_INTERVAL = 300  # Check session health every 5 minutes
+SESSION_STALENESS_WINDOW = 30  # Seconds a successful WebDriver command vouches for the session
+AUTH_COOKIE_NAMES = ["xman_us_t", "xman_t", "cookie2", "_tb_token_"]  # Login cookies whose expiry ends the session
+AUTH_COOKIE_DOMAIN = "alibaba.com"  # Browser cookies under this domain are re-persisted to COOKIES_FILE
+COOKIE_EXPIRY_WARNING = 3 * 24 * 3600  # Warn once the login cookies expire within this many seconds
+COOKIE_REFRESH_INTERVAL = 900  # Save the browser's current cookies (if they changed) at most this often
+
+DETECTION_MODE = "push"  # "push" = CDP/MutationObserver events with polling fallback, "poll" = DOM polling only
+POLL_INTERVAL_MIN = 2  # Fallback poll interval while conversations keep arriving
+POLL_INTERVAL_MAX = 15  # Fallback poll interval once the inbox has been idle for a while
+POLL_BACKOFF_FACTOR = 1.5
+PUSH_WAIT_SLICE = 2  # Seconds each in-page event wait may hold the driver
+IDLE_REFRESH_INTERVAL = 100  # Check the page state after this many idle seconds
+HARD_REFRESH_INTERVAL = 1800  # Reload the PWA at least this often, even when its state looks valid
+IM_FRAME_KEYWORDS = ["messageType", "newMessage", "unreadCount", "msgId"]  # WebSocket payloads that signal a new message
+IM_XHR_URL_KEYWORDS = ["/message/push", "/im/sync", "newMessage"]  # XHR endpoints that deliver new messages
+MAX_CONVERSATIONS_PER_CYCLE = 20  # Cap on conversations drained in a single poll cycle
+CONVERSATION_LIST_TIMEOUT = 10  # Seconds to wait for the inbox to render after navigation
+INBOX_SHELL_SELECTOR = ".contact-list, .send-box"  # Parts of the OneTalk page that render even when the inbox has no conversations
+WAIT_TIMEOUT = 10  # Default upper bound for readiness waits
+WAIT_POLL_FREQUENCY = 0.1  # Seconds between readiness checks
+WAIT_STATS_LOG_EVERY = 50  # Log wait timings every N waits
+ERROR_BACKOFF_MIN = 2  # Seconds to back off after the first main-loop error, doubled per consecutive error
+ERROR_BACKOFF_MAX = 60
+
+# Human-like pacing, kept separate from readiness waits: (min, max) seconds of jitter per step.
+# Set HUMAN_PACING to False to answer as fast as the page allows. With TAB_POOL_SIZE above 1 the
+# pauses of one tab are spent working on the others.
+HUMAN_PACING = True
+HUMAN_PAUSES = {
+    "after_open": (1.0, 2.5),  # Reading the buyer's message
+    "before_typing": (0.3, 1.0),
+    "before_send": (0.5, 1.5)  # Looking over the typed reply
+}
+
+TAB_POOL_SIZE = 1  # Conversation tabs worked on in parallel in one Chrome session; 1 = one at a time
+TAB_MEMORY_ESTIMATE_MB = 250  # Expected extra Chrome RSS per tab, used to cap the pool
+TAB_MIN_FREE_MEMORY_MB = 1024  # System memory kept free; no tabs are opened beyond it
+TAB_MAX_ERRORS = 3  # Consecutive failures after which a conversation tab is closed and replaced
+TAB_IDLE_SLICE = 0.05  # Seconds the scheduler sleeps when every tab is waiting
+
+WORKERS_DIR = os.path.join(BASE_DIR, "workers")  # Per-account cookies, profile and logs
+WORKER_RESTART_BACKOFF = 10  # Seconds before restarting a crashed worker, doubled per quick crash
+WORKER_MAX_RESTART_BACKOFF = 600
+WORKER_STABLE_AFTER = 600  # A worker that ran this long resets its restart backoff
+SUPERVISOR_REPORT_INTERVAL = 300  # Seconds between per-worker throughput reports
+
+# Chrome resource watchdog: a browser crossing any limit is recycled in the next idle window
+WATCHDOG_INTERVAL = 30  # Seconds between samples of the Chrome process tree; None disables the watchdog
+WATCHDOG_TREND_WINDOW = 3600  # Seconds of RSS samples the growth trend is fitted over
+WATCHDOG_MAX_RSS_MB = 1500  # Total RSS of Chrome and its children
+WATCHDOG_MAX_RSS_GROWTH = 300  # MB per hour, judged once half a trend window has been sampled
+WATCHDOG_MAX_CPU_PERCENT = 90  # Summed over the tree, so it can exceed 100 on several cores
+WATCHDOG_CPU_SUSTAIN = 10  # Consecutive samples above the CPU limit before recycling
+WATCHDOG_MIN_BROWSER_AGE = 600  # Never recycle a browser younger than this
+WATCHDOG_MAX_BROWSER_AGE = 12 * 3600  # Recycle at least this often; None disables it
+
+TOTAL_CONVERSATIONS_ANSWERED = 0
+THROUGHPUT_STARTED_AT = None
+WORKER_NAME = None
+WORKER_STATS_QUEUE = None
+
+SESSION_LAST_HEALTHY = 0.0
+SESSION_SUSPECT = True
+
+WAIT_STATS = {}
+WAIT_COUNT = 0
+
+NAV_STATS = {"soft": 0, "hard": 0, "hard_seconds": 0.0}
+LAST_HARD_RELOAD = time.time()
+
+NEW_MESSAGE_EVENTS = queue.Queue()
 
 # ------------------ LOGGING ------------------
 
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that also rolls over once LOG_ROTATE_INTERVAL has passed"""
+
+    def __init__(self, filename, max_bytes, interval, backup_count):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record):
+        if time.time() >= self.rollover_at and os.path.exists(self.baseFilename):
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread without formatting them in the caller"""
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class PlainLogFormatter(logging.Formatter):
+    def format(self, record):
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.created))
+        if record.levelno >= logging.ERROR:
+            line = f"{timestamp} - ERROR: {record.msg}\n"
+            if record.exc_text:
+                line += record.exc_text + "\n"
+            return line
+        return f"{timestamp} - {record.msg}"
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "log": record.name.rsplit(".", 1)[-1],
+            "message": record.msg
+        }
+        if record.exc_text:
+            entry["traceback"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class ConsoleLogFormatter(logging.Formatter):
+    def format(self, record):
+        if record.levelno >= logging.ERROR:
+            return f"[❌ ERROR] {record.msg}"
+        return f"📘 {record.msg}"
+
+LOG_LISTENER = None
+ACTIVITY_LOGGER = logging.getLogger("alibaba.activity")
+ERROR_LOGGER = logging.getLogger("alibaba.error")
+
+def setup_logging():
+    """(Re)start the background log writer with the current LOG_* settings"""
+    global LOG_LISTENER
+    stop_logging()
+
+    level = getattr(logging, LOG_LEVEL.upper(), logging.INFO)
+    formatter = JsonLogFormatter() if LOG_JSONL else PlainLogFormatter()
+    suffix = ".jsonl" if LOG_JSONL else ""
+
+    handlers = []
+    for path, logger in ((ACTIVITY_LOG, ACTIVITY_LOGGER), (ERROR_LOG, ERROR_LOGGER)):
+        handler = SizeAndTimeRotatingFileHandler(path + suffix, LOG_MAX_BYTES, LOG_ROTATE_INTERVAL, LOG_BACKUP_COUNT)
+        handler.setFormatter(formatter)
+        handler.setLevel(level)
+        handler.addFilter(logging.Filter(logger.name))
+        handlers.append(handler)
+    if LOG_TO_CONSOLE:
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(ConsoleLogFormatter())
+        console.setLevel(level)
+        handlers.append(console)
+
+    log_queue = queue.Queue()
+    for logger in (ACTIVITY_LOGGER, ERROR_LOGGER):
+        logger.handlers = [LogQueueHandler(log_queue)]
+        logger.setLevel(level)
+        logger.propagate = False
+
+    LOG_LISTENER = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    LOG_LISTENER.start()
+
+def stop_logging():
+    """Flush pending log records and stop the writer thread"""
+    global LOG_LISTENER
+    if LOG_LISTENER is not None:
+        LOG_LISTENER.stop()
+        for handler in LOG_LISTENER.handlers:
+            handler.close()
+        LOG_LISTENER = None
+
+atexit.register(stop_logging)
+
 def log_error(error_message):
-    with open(ERROR_LOG, "a", encoding="utf-8") as log_file:
-        log_file.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - ERROR: {error_message}\n")
-        log_file.write(traceback.format_exc() + "\n\n")
-    print(f"[❌ ERROR] {error_message}")
+    if LOG_LISTENER is None:
+        setup_logging()
+    # Only attach a traceback when an exception is actually being handled
+    ERROR_LOGGER.error(error_message, exc_info=sys.exc_info()[0] is not None)
 
 def log_activity(message):
-    timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-    with open(ACTIVITY_LOG, "a", encoding="utf-8") as log:
-        log.write(f"{timestamp} - {message}\n")
-    print(f"📘 {message}")
+    if LOG_LISTENER is None:
+        setup_logging()
+    level = logging.WARNING if message.startswith("⚠️") else logging.INFO
+    ACTIVITY_LOGGER.log(level, message)
 
 def wait_for_user_confirmation(message):
     print(f"[ℹ️] {message}")
@@ -91,21 +367,240 @@ def wait_for_user_confirmation(message):
 
 def cleanup_and_exit():
     global CHROME_PID
+    STANDBY_BROWSER.close()
     cleanup_our_chrome_process()
     sys.exit(1)
 
+# ------------------ METRICS ------------------
+
+METRICS_LOCK = threading.Lock()
+COUNTERS = {}
+GAUGES = {}
+HISTOGRAMS = {}
+METRICS_STARTED_AT = time.time()
+
+def metric_key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+def inc_counter(name, value=1, **labels):
+    with METRICS_LOCK:
+        key = metric_key(name, labels)
+        COUNTERS[key] = COUNTERS.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    with METRICS_LOCK:
+        GAUGES[metric_key(name, labels)] = value
+
+def observe(name, value, **labels):
+    with METRICS_LOCK:
+        key = metric_key(name, labels)
+        histogram = HISTOGRAMS.get(key)
+        if histogram is None:
+            histogram = HISTOGRAMS[key] = {
+                "buckets": [0] * len(LATENCY_BUCKETS),
+                "sum": 0.0,
+                "count": 0,
+                "recent": deque(maxlen=METRICS_SAMPLE_SIZE)
+            }
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+        histogram["recent"].append(value)
+
+@contextmanager
+def timed_stage(stage):
+    """Time a named stage of message processing into alibaba_stage_seconds"""
+    start = time.time()
+    try:
+        yield
+    finally:
+        observe("alibaba_stage_seconds", time.time() - start, stage=stage)
+
+def collect_service_metrics():
+    """Refresh gauges that are read from other components rather than pushed"""
+    try:
+        rag = RAG_CLIENT.stats()
+        set_gauge("alibaba_rag_error_rate", rag["error_rate"])
+        set_gauge("alibaba_rag_circuit_open", int(rag["circuit_open"]))
+        set_gauge("alibaba_rag_latency_avg_seconds", rag["latency_avg"])
+        cache = REPLY_CACHE.stats()
+        set_gauge("alibaba_reply_cache_hit_rate", cache["hit_rate"])
+        set_gauge("alibaba_reply_cache_entries", cache["entries"])
+        set_gauge("alibaba_outbox_pending", WEBHOOK_OUTBOX.pending_count())
+    except Exception as e:
+        log_activity(f"⚠️ Could not collect service metrics: {str(e)}")
+
+    uptime_minutes = max((time.time() - METRICS_STARTED_AT) / 60, 1e-6)
+    with METRICS_LOCK:
+        processed = COUNTERS.get(metric_key("alibaba_messages_processed_total", {}), 0)
+        replies = {dict(labels).get("source"): value for (name, labels), value in COUNTERS.items() if name == "alibaba_replies_total"}
+    set_gauge("alibaba_messages_per_minute", processed / uptime_minutes)
+    total_replies = sum(replies.values())
+    set_gauge("alibaba_fallback_reply_ratio", replies.get("fallback", 0) / total_replies if total_replies else 0.0)
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels, extra=None):
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in items) + "}"
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format"""
+    collect_service_metrics()
+    lines = []
+    with METRICS_LOCK:
+        for kind, store in (("counter", COUNTERS), ("gauge", GAUGES)):
+            declared = set()
+            for (name, labels), value in sorted(store.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {name} {kind}")
+                    declared.add(name)
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        declared = set()
+        for (name, labels), histogram in sorted(HISTOGRAMS.items(), key=lambda item: item[0]):
+            if name not in declared:
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def metrics_snapshot():
+    """Plain-dict view of all metrics, with p50/p95 over recent observations"""
+    collect_service_metrics()
+    with METRICS_LOCK:
+        return {
+            "ts": round(time.time(), 3),
+            "counters": {name + format_labels(labels): value for (name, labels), value in COUNTERS.items()},
+            "gauges": {name + format_labels(labels): value for (name, labels), value in GAUGES.items()},
+            "histograms": {
+                name + format_labels(labels): {
+                    "count": h["count"],
+                    "sum": round(h["sum"], 4),
+                    "p50": percentile(h["recent"], 0.5),
+                    "p95": percentile(h["recent"], 0.95)
+                }
+                for (name, labels), h in HISTOGRAMS.items()
+            }
+        }
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = render_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body = json.dumps(metrics_snapshot()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def dump_metrics_periodically():
+    while True:
+        time.sleep(METRICS_DUMP_INTERVAL)
+        try:
+            with open(METRICS_DUMP_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(metrics_snapshot()) + "\n")
+        except Exception as e:
+            log_error(f"⚠️ Could not dump metrics: {str(e)}")
+
+def start_metrics():
+    """Start the local metrics endpoint and the periodic JSONL dump"""
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", METRICS_PORT), MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            log_activity(f"📈 Metrics at http://127.0.0.1:{METRICS_PORT}/metrics")
+        except OSError as e:
+            log_error(f"⚠️ Could not start metrics endpoint on port {METRICS_PORT}: {str(e)}")
+    if METRICS_DUMP_INTERVAL:
+        threading.Thread(target=dump_metrics_periodically, name="metrics-dump", daemon=True).start()
+
 # ------------------ SESSION MANAGEMENT ------------------
 
-def is_session_valid(driver):
-    """Check if the current session is still valid"""
+# Errors that prove the browser answered the command, i.e. the session itself is alive
+SESSION_ALIVE_ERRORS = (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+    ElementNotInteractableException,
+    ElementClickInterceptedException
+)
+
+def mark_session_healthy():
+    global SESSION_LAST_HEALTHY, SESSION_SUSPECT
+    SESSION_LAST_HEALTHY = time.time()
+    SESSION_SUSPECT = False
+
+def mark_session_suspect():
+    global SESSION_SUSPECT
+    SESSION_SUSPECT = True
+
+def track_session_liveness(driver):
+    """Wrap driver.execute so every WebDriver command updates the liveness state.
+
+    Element commands go through their parent driver's execute as well, so
+    this covers find_element, click, send_keys and friends.
+    """
+    original_execute = driver.execute
+
+    def execute(driver_command, params=None):
+        try:
+            result = original_execute(driver_command, params)
+        except SESSION_ALIVE_ERRORS:
+            mark_session_healthy()
+            raise
+        except Exception:
+            mark_session_suspect()
+            raise
+        mark_session_healthy()
+        return result
+
+    driver.execute = execute
+    mark_session_suspect()
+    return driver
+
+def is_session_valid(driver, force=False):
+    """Check if the current session is still valid.
+
+    Only probes the browser after a failed command, once SESSION_STALENESS_WINDOW
+    has passed without a successful one, or when force is set.
+    """
+    if not force and not SESSION_SUSPECT and time.time() - SESSION_LAST_HEALTHY < SESSION_STALENESS_WINDOW:
+        return True
     try:
         # Try a simple operation to test session validity
         driver.current_url
-        driver.title
+        mark_session_healthy()
         return True
     except (InvalidSessionIdException, WebDriverException):
+        mark_session_suspect()
         return False
     except Exception as e:
+        mark_session_suspect()
         log_activity(f"⚠️ Unexpected error checking session: {str(e)}")
         return False
 
@@ -126,9 +621,178 @@ def cleanup_our_chrome_process():
         finally:
             CHROME_PID = None
 
-def start_browser():
-    """Start browser with enhanced error handling"""
+CHROME_LAUNCH_LOCK = threading.Lock()
+
+def profile_is_warm(profile_dir):
+    """True when profile_dir already holds a Chrome profile from an earlier run"""
+    return bool(profile_dir) and os.path.isdir(profile_dir) and bool(os.listdir(profile_dir))
+
+def launch_chrome(profile_dir=None):
+    """Launch one uc.Chrome instance and record how long it took.
+
+    Launches are serialized because undetected_chromedriver patches the
+    chromedriver binary on every start. Supervised workers share one binary
+    across processes, so they reuse the copy run_supervisor() patched instead.
+    """
+    options = uc.ChromeOptions()
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-web-security")
+    options.add_argument("--allow-running-insecure-content")
+    options.add_argument("--disable-features=VizDisplayCompositor")
+    options.add_argument("--headless=new")
+    for argument in LIGHTWEIGHT_CHROME_ARGS:
+        options.add_argument(argument)
+
+    profile = "warm" if profile_is_warm(profile_dir) else "cold"
+    with CHROME_LAUNCH_LOCK:
+        started = time.time()
+        driver = uc.Chrome(
+            options=options,
+            version_main=None,
+            user_data_dir=profile_dir,
+            enable_cdp_events=DETECTION_MODE == "push",
+            user_multi_procs=WORKER_NAME is not None
+        )
+        elapsed = time.time() - started
+    observe("alibaba_browser_start_seconds", elapsed, profile=profile)
+    log_activity(f"⏱️ Chrome (PID: {driver.browser_pid}) launched in {elapsed:.1f}s with a {profile} profile")
+    return driver
+
+def retire_browser(driver, pid):
+    """Quit a browser we no longer use and make sure its process is gone"""
+    try:
+        driver.quit()
+    except Exception:
+        pass
+    try:
+        process = psutil.Process(pid)
+        if process.is_running():
+            process.terminate()
+            process.wait(timeout=5)
+    except (psutil.NoSuchProcess, psutil.TimeoutExpired, TypeError, ValueError):
+        pass
+
+def blocked_url_patterns():
+    patterns = list(BLOCKED_RESOURCE_PATTERNS)
+    for domain in BLOCKED_DOMAINS:
+        patterns += [f"*://{domain}/*", f"*://*.{domain}/*"]
+    return patterns
+
+def apply_resource_blocking(driver):
+    """Keep the PWA from downloading fonts, media, images and trackers it does not need.
+
+    BLOCK_ALLOWLIST goes out as allow-entries in urlPatterns, which Chrome
+    checks before the wildcard urls. Chrome versions without urlPatterns
+    ignore it and block by urls alone.
+    """
+    if not BLOCK_RESOURCES:
+        return
+    patterns = blocked_url_patterns()
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {
+            "urls": patterns,
+            "urlPatterns": [{"urlPattern": pattern, "block": False} for pattern in BLOCK_ALLOWLIST]
+        })
+        log_activity(f"🚫 Blocking {len(patterns)} URL patterns ({len(BLOCK_ALLOWLIST)} allowlisted)")
+    except WebDriverException as e:
+        log_activity(f"⚠️ Could not enable resource blocking: {str(e)}")
+
+def adopt_browser(driver):
+    """Make driver the browser the main loop works with"""
     global CHROME_PID
+    CHROME_PID = driver.browser_pid
+    track_session_liveness(driver)
+    apply_resource_blocking(driver)
+    if DETECTION_MODE == "push":
+        start_push_detection(driver)
+    return driver
+
+def standby_profile_dir(active_profile_dir):
+    """The standby needs its own user-data-dir, Chrome locks a profile to one instance"""
+    if not CHROME_PROFILE_DIR:
+        return None
+    standby = f"{CHROME_PROFILE_DIR}-standby"
+    return CHROME_PROFILE_DIR if active_profile_dir == standby else standby
+
+class StandbyBrowser:
+    """A second, already-running Chrome that recover_session() swaps in instead of cold-starting one.
+
+    The standby sits idle on about:blank. After a swap, the crashed browser is
+    retired and a new standby is launched on its profile dir in the background,
+    so the two profile dirs simply alternate between the active browser and
+    the standby.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.driver = None
+        self.profile_dir = None
+        self.launching = False
+        self.closed = False
+
+    def prepare(self, profile_dir, retire=None):
+        """Launch the standby in a background thread, after retiring the (driver, pid) that held profile_dir"""
+        with self.lock:
+            if self.closed or self.driver or self.launching:
+                if retire:
+                    threading.Thread(target=retire_browser, args=retire, daemon=True).start()
+                return
+            self.launching = True
+        threading.Thread(target=self._launch, args=(profile_dir, retire), daemon=True, name="chrome-standby").start()
+
+    def _launch(self, profile_dir, retire):
+        try:
+            if retire:
+                retire_browser(*retire)
+            driver = launch_chrome(profile_dir)
+            with self.lock:
+                kept = not self.closed
+                if kept:
+                    self.driver, self.profile_dir = driver, profile_dir
+            if kept:
+                log_activity(f"🟢 Standby Chrome ready (PID: {driver.browser_pid})")
+            else:
+                retire_browser(driver, driver.browser_pid)
+        except Exception as e:
+            log_error(f"⚠️ Failed to launch standby browser: {str(e)}")
+        finally:
+            with self.lock:
+                self.launching = False
+
+    def take(self):
+        """Hand over the standby as (driver, profile_dir), or (None, None) if none is usable"""
+        with self.lock:
+            driver, profile_dir = self.driver, self.profile_dir
+            self.driver = self.profile_dir = None
+        if driver is None:
+            return None, None
+        try:
+            driver.current_url
+        except Exception:
+            log_activity("⚠️ Standby browser is dead, discarding it")
+            threading.Thread(target=retire_browser, args=(driver, driver.browser_pid), daemon=True).start()
+            return None, None
+        return driver, profile_dir
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            driver, self.driver = self.driver, None
+        if driver:
+            retire_browser(driver, driver.browser_pid)
+
+STANDBY_BROWSER = StandbyBrowser()
+ACTIVE_PROFILE_DIR = None
+
+def start_browser(profile_dir=None):
+    """Start browser with enhanced error handling"""
+    global ACTIVE_PROFILE_DIR
+    profile_dir = profile_dir or CHROME_PROFILE_DIR
     
     # Only clean up our own Chrome process if it exists
     cleanup_our_chrome_process()
@@ -136,23 +800,15 @@ def start_browser():
     max_attempts = 3
     for attempt in range(max_attempts):
         try:
-            options = uc.ChromeOptions()
-            options.add_argument("--disable-blink-features=AutomationControlled")
-            options.add_argument("--disable-gpu")
-            options.add_argument("--no-sandbox")
-            options.add_argument("--disable-dev-shm-usage")
-            options.add_argument("--disable-extensions")
-            options.add_argument("--disable-web-security")
-            options.add_argument("--allow-running-insecure-content")
-            options.add_argument("--disable-features=VizDisplayCompositor")
-            options.add_argument("--headless=new")
-
-            driver = uc.Chrome(options=options, version_main=None)
-            CHROME_PID = driver.browser_pid
+            driver = launch_chrome(profile_dir)
+            adopt_browser(driver)
+            ACTIVE_PROFILE_DIR = profile_dir
             log_activity(f"🔵 Started Chrome with PID: {CHROME_PID} (attempt {attempt + 1})")
             
             # Test the session immediately
             if is_session_valid(driver):
+                if WARM_STANDBY:
+                    STANDBY_BROWSER.prepare(standby_profile_dir(profile_dir))
                 return driver
             else:
                 driver.quit()
@@ -168,11 +824,25 @@ def start_browser():
     
     return None
 
-def recover_session(driver):
+def recover_session(driver, cause="broken"):
     """Attempt to recover from a broken session"""
-    global CHROME_PID
+    global ACTIVE_PROFILE_DIR
     
     log_activity("🔄 Attempting session recovery...")
+    inc_counter("alibaba_session_recoveries_total", cause=cause)
+    started = time.time()
+
+    # Swap in the prelaunched standby and retire the broken browser in the background
+    standby, standby_profile = STANDBY_BROWSER.take() if WARM_STANDBY else (None, None)
+    if standby:
+        broken = (driver, CHROME_PID)
+        adopt_browser(standby)
+        STANDBY_BROWSER.prepare(ACTIVE_PROFILE_DIR, retire=broken if driver else None)
+        ACTIVE_PROFILE_DIR = standby_profile
+        elapsed = time.time() - started
+        observe("alibaba_session_recovery_seconds", elapsed, path="standby")
+        log_activity(f"✅ Session recovered by swapping in the standby browser (PID: {CHROME_PID}) in {elapsed:.2f}s")
+        return standby
     
     try:
         # Try to quit the current driver gracefully
@@ -190,85 +860,615 @@ def recover_session(driver):
     # Wait a bit for cleanup
     time.sleep(3)
     
-    # Start a new browser session
-    new_driver = start_browser()
+    # Start a new browser session on the profile the broken one released
+    new_driver = start_browser(ACTIVE_PROFILE_DIR)
     if new_driver:
+        observe("alibaba_session_recovery_seconds", time.time() - started, path="cold")
         log_activity("✅ Session recovered successfully")
         return new_driver
     else:
         log_error("❌ Failed to recover session")
         cleanup_and_exit()
 
+# ------------------ RESOURCE WATCHDOG ------------------
+
+def chrome_processes(pid):
+    """Our Chrome browser process and all of its children (renderers, GPU, utility)"""
+    try:
+        browser = psutil.Process(pid)
+        return [browser] + browser.children(recursive=True)
+    except (psutil.NoSuchProcess, psutil.AccessDenied, TypeError, ValueError):
+        return []
+
+def growth_per_hour(samples):
+    """Least-squares slope of (timestamp, value) samples, in value units per hour"""
+    if len(samples) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in samples) / len(samples)
+    mean_v = sum(v for _, v in samples) / len(samples)
+    variance = sum((t - mean_t) ** 2 for t, _ in samples)
+    if not variance:
+        return 0.0
+    return sum((t - mean_t) * (v - mean_v) for t, v in samples) / variance * 3600
+
+class ResourceWatchdog:
+    """Samples RSS and CPU of the Chrome process tree and flags the browser for recycling.
+
+    Runs in a daemon thread and never touches the driver itself: when a
+    threshold is crossed it only sets recycle_reason, which the main loop
+    acts on in its next idle window.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.since = time.time()
+        self.samples = deque()
+        self.cpu_high = 0
+        self.processes = {}
+        self.recycle_reason = None
+        self.last = {}
+        self.thread = None
+
+    def start(self):
+        if WATCHDOG_INTERVAL and (self.thread is None or not self.thread.is_alive()):
+            self.thread = threading.Thread(target=self._run, daemon=True, name="chrome-watchdog")
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(WATCHDOG_INTERVAL)
+            try:
+                self.sample()
+            except Exception as e:
+                log_error(f"⚠️ Resource watchdog sample failed: {str(e)}")
+
+    def reset(self, pid):
+        with self.lock:
+            self.pid = pid
+            self.since = time.time()
+            self.samples.clear()
+            self.cpu_high = 0
+            self.processes = {}
+            self.recycle_reason = None
+
+    def sample(self):
+        if CHROME_PID != self.pid:
+            self.reset(CHROME_PID)
+        rss = 0
+        cpu = 0.0
+        alive = {}
+        for process in chrome_processes(self.pid):
+            # Reuse Process objects, cpu_percent() measures since the previous call on the same object
+            process = self.processes.get(process.pid, process)
+            try:
+                rss += process.memory_info().rss
+                cpu += process.cpu_percent(None)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            alive[process.pid] = process
+        if not alive:
+            return None
+
+        now = time.time()
+        rss_mb = rss / (1024 * 1024)
+        with self.lock:
+            self.processes = alive
+            self.samples.append((now, rss_mb))
+            while self.samples and now - self.samples[0][0] > WATCHDOG_TREND_WINDOW:
+                self.samples.popleft()
+            growth = growth_per_hour(self.samples)
+            self.cpu_high = self.cpu_high + 1 if cpu > WATCHDOG_MAX_CPU_PERCENT else 0
+            self.last = {"rss_mb": rss_mb, "cpu_percent": cpu, "processes": len(alive), "rss_growth_mb_per_hour": growth}
+            reason = self.recycle_reason or self.check(now, rss_mb, growth)
+            self.recycle_reason = reason
+
+        set_gauge("alibaba_chrome_rss_bytes", rss)
+        set_gauge("alibaba_chrome_cpu_percent", round(cpu, 1))
+        set_gauge("alibaba_chrome_processes", len(alive))
+        set_gauge("alibaba_chrome_rss_growth_mb_per_hour", round(growth, 1))
+        set_gauge("alibaba_chrome_recycle_pending", 1 if reason else 0)
+        return self.last
+
+    def check(self, now, rss_mb, growth):
+        """Reason to recycle the browser, or None; caller holds the lock"""
+        age = now - self.since
+        if age < WATCHDOG_MIN_BROWSER_AGE:
+            return None
+        reason = None
+        if WATCHDOG_MAX_RSS_MB and rss_mb > WATCHDOG_MAX_RSS_MB:
+            reason = f"RSS {rss_mb:.0f} MB above {WATCHDOG_MAX_RSS_MB} MB"
+        elif (WATCHDOG_MAX_RSS_GROWTH and now - self.samples[0][0] >= WATCHDOG_TREND_WINDOW / 2
+              and growth > WATCHDOG_MAX_RSS_GROWTH):
+            reason = f"RSS growing {growth:.0f} MB/h"
+        elif self.cpu_high >= WATCHDOG_CPU_SUSTAIN:
+            reason = f"CPU above {WATCHDOG_MAX_CPU_PERCENT}% for {self.cpu_high} samples"
+        elif WATCHDOG_MAX_BROWSER_AGE and age > WATCHDOG_MAX_BROWSER_AGE:
+            reason = f"browser running for {age / 3600:.1f}h"
+        if reason:
+            log_activity(f"🩺 Chrome flagged for recycling: {reason}")
+        return reason
+
+WATCHDOG = ResourceWatchdog()
+
+def recycle_browser(driver):
+    """Replace a degrading browser between conversations and log back in"""
+    reason = WATCHDOG.recycle_reason
+    log_activity(f"♻️ Recycling Chrome (PID: {CHROME_PID}) during idle time: {reason}")
+    inc_counter("alibaba_browser_recycles_total")
+    driver = recover_session(driver, cause="recycle")
+    WATCHDOG.reset(CHROME_PID)
+    if not login(driver):
+        raise InvalidSessionIdException("Login failed after recycling the browser")
+    close_dialogs(driver)
+    return driver
+
+# ------------------ WAITS ------------------
+
+def record_wait(name, seconds, timed_out):
+    """Accumulate how long each named wait actually took, for tuning timeouts and pacing"""
+    global WAIT_COUNT
+    stats = WAIT_STATS.setdefault(name, {"count": 0, "timeouts": 0, "total": 0.0, "max": 0.0})
+    stats["count"] += 1
+    stats["timeouts"] += int(timed_out)
+    stats["total"] += seconds
+    stats["max"] = max(stats["max"], seconds)
+    observe("alibaba_wait_seconds", seconds, wait=name)
+    if timed_out:
+        inc_counter("alibaba_wait_timeouts_total", wait=name)
+
+    WAIT_COUNT += 1
+    if WAIT_COUNT % WAIT_STATS_LOG_EVERY == 0:
+        summary = ", ".join(
+            f"{key} avg {value['total'] / value['count']:.2f}s max {value['max']:.2f}s ({value['timeouts']} timeouts)"
+            for key, value in sorted(WAIT_STATS.items())
+        )
+        log_activity(f"⏱️ Waits: {summary}")
+
+def wait_until(driver, name, condition, timeout=WAIT_TIMEOUT):
+    """Wait for a readiness condition; returns its result, or None on timeout"""
+    start = time.time()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL_FREQUENCY).until(condition)
+        record_wait(name, time.time() - start, False)
+        return result
+    except TimeoutException:
+        record_wait(name, time.time() - start, True)
+        return None
+
+def human_delay(step):
+    """Seconds of jitter for a step, or 0 when human pacing is disabled"""
+    if not HUMAN_PACING:
+        return 0
+    low, high = HUMAN_PAUSES.get(step, (0, 0))
+    return random.uniform(low, high)
+
+# Conversation work is written as step generators that yield what they are waiting for:
+# a number of seconds to pause, or a Future from the IO pool. run_steps() waits in place,
+# the tab scheduler works on other tabs in the meantime.
+
+def resume(steps, wait):
+    """Advance a step generator past a finished wait: a Future's result (or exception) is sent in"""
+    if isinstance(wait, Future):
+        try:
+            value = wait.result()
+        except Exception as e:
+            return steps.throw(e)
+        return steps.send(value)
+    return steps.send(None)
+
+def run_steps(steps):
+    """Run a step generator to completion in this thread and return its result"""
+    wait = 0
+    try:
+        while True:
+            if not isinstance(wait, Future):
+                time.sleep(wait)
+            wait = resume(steps, wait)
+    except StopIteration as stop:
+        return stop.value
+
+def error_backoff(consecutive_errors):
+    """Exponential backoff after consecutive main-loop errors"""
+    delay = min(ERROR_BACKOFF_MIN * (2 ** (consecutive_errors - 1)), ERROR_BACKOFF_MAX)
+    time.sleep(delay * random.uniform(0.8, 1.2))
+
+def page_loaded(driver):
+    return driver.execute_script("return document.readyState") == "complete"
+
+def thread_message_count(driver):
+    return driver.execute_script("return document.querySelectorAll('div.scroll-box > *').length")
+
+def send_button_enabled(driver):
+    """Return the send button once it is displayed and enabled, else False"""
+    buttons = driver.find_elements(By.XPATH, "//button[contains(@class, 'send-tool-button')]")
+    if buttons and buttons[0].is_displayed() and buttons[0].is_enabled() and "disabled" not in (buttons[0].get_attribute("class") or ""):
+        return buttons[0]
+    return False
+
+def wait_for_page_load(driver, timeout=WAIT_TIMEOUT):
+    return wait_until(driver, "page_load", page_loaded, timeout) is not None
+
+def wait_for_conversation_list(driver, timeout=CONVERSATION_LIST_TIMEOUT):
+    """Wait until the inbox is rendered: a conversation row, or the page shell when there are none"""
+    return wait_until(
+        driver, "conversation_list",
+        EC.presence_of_element_located((By.CSS_SELECTOR, "div[data-name], " + INBOX_SHELL_SELECTOR)), timeout
+    ) is not None
+
+def on_main_site(driver):
+    """False once OneTalk has redirected to the login page (or anywhere else off MAIN_URL's host)"""
+    return urlparse(driver.current_url).netloc == urlparse(MAIN_URL).netloc
+
 # ------------------ LOGIN ------------------
 
+LAST_COOKIE_REFRESH = 0
+COOKIES_SAVE_LOCK = threading.Lock()
+
+def load_cookies():
+    """Saved cookies in Selenium's format, or None when no cookies file exists yet"""
+    if not os.path.exists(COOKIES_FILE):
+        return None
+    with open(COOKIES_FILE, "r") as f:
+        return json.load(f)
+
+def save_cookies(cookies):
+    """Write cookies to COOKIES_FILE atomically; returns False when they were unchanged"""
+    with COOKIES_SAVE_LOCK:
+        try:
+            with open(COOKIES_FILE, "r") as f:
+                if json.load(f) == cookies:
+                    return False
+        except (OSError, ValueError):
+            pass
+        tmp_path = COOKIES_FILE + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(cookies, f)
+            os.replace(tmp_path, COOKIES_FILE)
+        except OSError as e:
+            log_error(f"⚠️ Could not save cookies: {str(e)}")
+            return False
+    return True
+
+def to_cdp_cookie(cookie):
+    """Selenium cookie dict -> Network.CookieParam"""
+    param = {
+        "name": cookie["name"],
+        "value": cookie["value"],
+        "path": cookie.get("path", "/"),
+        "secure": cookie.get("secure", False),
+        "httpOnly": cookie.get("httpOnly", False)
+    }
+    if cookie.get("domain"):
+        param["domain"] = cookie["domain"]
+    else:
+        param["url"] = BASE_URL
+    if cookie.get("expiry"):
+        param["expires"] = cookie["expiry"]
+    # Chrome rejects SameSite=None on insecure cookies, so leave those at the default
+    if cookie.get("sameSite") in ("Strict", "Lax") or (cookie.get("sameSite") == "None" and param["secure"]):
+        param["sameSite"] = cookie["sameSite"]
+    return param
+
+def from_cdp_cookie(cookie):
+    """Network.Cookie -> Selenium cookie dict, the format COOKIES_FILE is kept in"""
+    converted = {
+        "name": cookie["name"],
+        "value": cookie["value"],
+        "domain": cookie["domain"],
+        "path": cookie.get("path", "/"),
+        "secure": cookie.get("secure", False),
+        "httpOnly": cookie.get("httpOnly", False)
+    }
+    if not cookie.get("session") and cookie.get("expires", -1) > 0:
+        converted["expiry"] = int(cookie["expires"])
+    if cookie.get("sameSite"):
+        converted["sameSite"] = cookie["sameSite"]
+    return converted
+
+def cookie_expiry(cookies):
+    """Earliest expiry (epoch seconds) among the login cookies, or None if none of them expires"""
+    expiries = [c["expiry"] for c in cookies if c.get("name") in AUTH_COOKIE_NAMES and c.get("expiry")]
+    return min(expiries) if expiries else None
+
+def check_cookie_expiry(cookies):
+    """Warn while there is still time to log in again; returns the seconds the login cookies have left"""
+    expiry = cookie_expiry(cookies)
+    if expiry is None:
+        return None
+    remaining = expiry - time.time()
+    set_gauge("alibaba_auth_cookie_expiry_seconds", remaining)
+    if remaining <= 0:
+        log_error(f"❌ Login cookies in {COOKIES_FILE} have expired. Log in manually to save fresh ones.")
+    elif remaining < COOKIE_EXPIRY_WARNING:
+        log_activity(f"⚠️ Login cookies expire in {remaining / 3600:.1f}h. Log in manually before then to keep the session alive.")
+    return remaining
+
+def inject_cookies(driver, cookies):
+    """Install all cookies with one CDP call, before any page is loaded"""
+    try:
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": [to_cdp_cookie(c) for c in cookies]})
+        return
+    except WebDriverException as e:
+        log_activity(f"⚠️ Bulk cookie injection failed, adding cookies one by one: {str(e)}")
+
+    # add_cookie only works on a page of the cookies' domain
+    driver.get(BASE_URL)
+    wait_for_page_load(driver)
+    for cookie in cookies:
+        try:
+            driver.add_cookie(cookie)
+        except WebDriverException:
+            # Skip invalid cookies
+            continue
+
+def refresh_saved_cookies(driver):
+    """Re-persist the browser's login cookies in the background, at most every COOKIE_REFRESH_INTERVAL"""
+    global LAST_COOKIE_REFRESH
+    if time.time() - LAST_COOKIE_REFRESH < COOKIE_REFRESH_INTERVAL:
+        return
+    LAST_COOKIE_REFRESH = time.time()
+    try:
+        browser_cookies = driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+    except WebDriverException as e:
+        log_error(f"⚠️ Could not read browser cookies: {str(e)}")
+        return
+
+    cookies = sorted(
+        (
+            from_cdp_cookie(c) for c in browser_cookies
+            if c.get("domain", "").lstrip(".") == AUTH_COOKIE_DOMAIN or c.get("domain", "").endswith("." + AUTH_COOKIE_DOMAIN)
+        ),
+        key=lambda c: (c["domain"], c["path"], c["name"])
+    )
+    if not cookies:
+        return
+    check_cookie_expiry(cookies)
+    IO_POOL.submit(save_cookies, cookies)
+
 def login(driver):
-    """Login with enhanced error handling"""
+    """Log in from saved cookies: one bulk injection, one navigation, one inbox readiness check"""
     max_attempts = 3
     for attempt in range(max_attempts):
+        started = time.time()
         try:
             if not is_session_valid(driver):
                 log_activity("⚠️ Invalid session detected during login")
                 return False
-                
-            driver.get(BASE_URL)
-            time.sleep(3)
-            
-            if os.path.exists(COOKIES_FILE):
-                with open(COOKIES_FILE, "r") as f:
-                    cookies = json.load(f)
-                    for cookie in cookies:
-                        try:
-                            driver.add_cookie(cookie)
-                        except Exception as e:
-                            # Skip invalid cookies
-                            continue
-                log_activity("✅ Cookies loaded.")
-            else:
+
+            cookies = load_cookies()
+            if cookies is None:
+                driver.get(BASE_URL)
+                wait_for_page_load(driver)
                 wait_for_user_confirmation("🔐 No cookies found. Please log in manually in the browser window.")
                 driver.get(MAIN_URL)
-                time.sleep(10)
-                cookies = driver.get_cookies()
-                with open(COOKIES_FILE, "w") as f:
-                    json.dump(cookies, f)
+                wait_for_conversation_list(driver, timeout=30)
+                save_cookies(driver.get_cookies())
                 log_activity("✅ Cookies saved after manual login.")
-            
+            elif cookies:
+                check_cookie_expiry(cookies)
+                inject_cookies(driver, cookies)
+                log_activity(f"✅ {len(cookies)} cookies loaded.")
+
             driver.get(MAIN_URL)
-            time.sleep(5)
-            
-            # Verify we're logged in by checking for expected elements
-            if is_session_valid(driver):
+
+            # Verify we're logged in: still on OneTalk and its page rendered, even with an empty inbox
+            if wait_for_conversation_list(driver) and on_main_site(driver) and is_session_valid(driver):
+                elapsed = time.time() - started
+                observe("alibaba_login_seconds", elapsed)
+                log_activity(f"✅ Logged in ({elapsed:.1f}s)")
                 return True
-            else:
-                if attempt < max_attempts - 1:
-                    log_activity(f"⚠️ Login verification failed, retrying... (attempt {attempt + 1})")
-                    time.sleep(5)
-                    continue
-                    
+            # The inbox wait above already gave the page its time, so retry straight away
+            if attempt < max_attempts - 1:
+                log_activity(f"⚠️ Login verification failed, retrying... (attempt {attempt + 1})")
+
         except Exception as e:
             log_error(f"⚠️ Login failed (attempt {attempt + 1}): {str(e)}")
             if attempt < max_attempts - 1:
-                time.sleep(5)
+                error_backoff(attempt + 1)
                 continue
             else:
                 return False
-    
+
     return False
 
 # ------------------ API RESPONSE ------------------
 
-def get_api_response(question, img_url=None):
-    try:
-        url = RAG_URL
-        headers = {"Content-Type": "application/json"}
+class RagClient:
+    """Keep-alive HTTP client for the RAG endpoint with retries and a circuit breaker.
+
+    While the circuit is open every call fails fast (the caller falls back to a
+    canned reply) and a background thread probes the endpoint until it answers.
+    """
+
+    def __init__(self, url, batch_url=None):
+        self.url = url
+        self.batch_url = batch_url
+        self.batch_supported = True
+        self.executor = ThreadPoolExecutor(max_workers=RAG_POOL_SIZE, thread_name_prefix="rag")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=RAG_POOL_SIZE, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        self.lock = threading.Lock()
+        self.circuit_open = False
+        self.consecutive_failures = 0
+        self.counters = {
+            "requests": 0,
+            "successes": 0,
+            "errors": 0,
+            "retries": 0,
+            "short_circuited": 0,
+            "batches": 0,
+            "batched_items": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0
+        }
+
+    def _post(self, payload):
+        response = self.session.post(self.url, json=payload, timeout=(RAG_CONNECT_TIMEOUT, RAG_READ_TIMEOUT))
+        response.raise_for_status()
+        data = response.json()
+        if not isinstance(data, dict):
+            raise ValueError(f"Unexpected RAG response: {str(data)[:60]}")
+        return data
+
+    @staticmethod
+    def _payload(question, img_url):
         payload = {"query": question}
         if img_url:
             payload["image"] = img_url
+        return payload
 
-        response = requests.post(url, headers=headers, json=payload, timeout=10)
-        response.raise_for_status()
+    def search(self, question, img_url=None):
+        """Return the RAG response dict, or None if the endpoint is down or keeps failing"""
+        payload = self._payload(question, img_url)
 
-        data = response.json()
+        with self.lock:
+            self.counters["requests"] += 1
+            if self.circuit_open:
+                self.counters["short_circuited"] += 1
+                return None
+
+        last_error = None
+        for attempt in range(RAG_MAX_RETRIES + 1):
+            start = time.time()
+            try:
+                data = self._post(payload)
+                self._record_success(time.time() - start)
+                return data
+            except (requests.RequestException, ValueError) as e:
+                last_error = e
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if status is not None and 400 <= status < 500 and status != 429:
+                    break  # The request itself is bad, retrying will not help
+                if attempt < RAG_MAX_RETRIES:
+                    with self.lock:
+                        self.counters["retries"] += 1
+                    time.sleep(RAG_RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+        self._record_failure(last_error)
+        return None
+
+    def search_batch(self, items):
+        """RAG response dicts for [(question, img_url), ...] in order, None for items that failed.
+
+        Sends RAG_BATCH_SIZE items per request to the batch endpoint when one is
+        configured. Whatever it does not answer goes out as parallel single
+        requests, at most RAG_POOL_SIZE at a time.
+        """
+        results = [None] * len(items)
+        done = 0
+        if self.batch_url and self.batch_supported:
+            while done < len(items):
+                chunk = items[done:done + RAG_BATCH_SIZE]
+                answers = self._post_batch(chunk)
+                if answers is None:
+                    break
+                results[done:done + len(chunk)] = answers
+                done += len(chunk)
+        remaining = range(done, len(items))
+        for index, data in zip(remaining, self.executor.map(lambda index: self.search(*items[index]), remaining)):
+            results[index] = data
+        return results
+
+    def _post_batch(self, chunk):
+        """One batch request; None if the endpoint cannot batch or the request failed"""
+        with self.lock:
+            if self.circuit_open:
+                self.counters["requests"] += len(chunk)
+                self.counters["short_circuited"] += len(chunk)
+                return [None] * len(chunk)
+
+        start = time.time()
+        try:
+            response = self.session.post(
+                self.batch_url,
+                json={"items": [self._payload(question, img_url) for question, img_url in chunk]},
+                timeout=(RAG_CONNECT_TIMEOUT, RAG_READ_TIMEOUT * 2)
+            )
+            if response.status_code in (404, 405, 501):
+                self.batch_supported = False
+                log_activity(f"⚠️ RAG batch endpoint unsupported (HTTP {response.status_code}), sending single requests.")
+                return None
+            response.raise_for_status()
+            data = response.json()
+            results = data.get("results") if isinstance(data, dict) else None
+            if not isinstance(results, list) or len(results) != len(chunk):
+                raise ValueError(f"Unexpected RAG batch response: {str(data)[:60]}")
+        except (requests.RequestException, ValueError) as e:
+            log_activity(f"⚠️ RAG batch request failed, sending single requests: {str(e)}")
+            return None
+
+        self._record_success(time.time() - start)
+        with self.lock:
+            self.counters["requests"] += len(chunk)
+            self.counters["batches"] += 1
+            self.counters["batched_items"] += len(chunk)
+        return [result if isinstance(result, dict) else None for result in results]
+
+    def _record_success(self, latency):
+        with self.lock:
+            self.counters["successes"] += 1
+            self.counters["latency_total"] += latency
+            self.counters["latency_max"] = max(self.counters["latency_max"], latency)
+            self.consecutive_failures = 0
+
+    def _record_failure(self, error):
+        with self.lock:
+            self.counters["errors"] += 1
+            self.consecutive_failures += 1
+            should_open = not self.circuit_open and self.consecutive_failures >= RAG_BREAKER_THRESHOLD
+            if should_open:
+                self.circuit_open = True
+        log_error(f"❌ API request failed: {str(error)}")
+        if should_open:
+            log_activity(f"🔌 RAG circuit opened after {self.consecutive_failures} failures, using canned replies.")
+            threading.Thread(target=self._probe_until_healthy, daemon=True).start()
+
+    def _probe_until_healthy(self):
+        while True:
+            time.sleep(RAG_BREAKER_COOLDOWN)
+            try:
+                self._post({"query": "ping"})
+            except (requests.RequestException, ValueError):
+                continue
+            with self.lock:
+                self.circuit_open = False
+                self.consecutive_failures = 0
+            log_activity("🔌 RAG endpoint is answering again, circuit closed.")
+            return
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["circuit_open"] = self.circuit_open
+        attempted = counters["successes"] + counters["errors"]
+        counters["error_rate"] = counters["errors"] / attempted if attempted else 0.0
+        counters["latency_avg"] = counters["latency_total"] / counters["successes"] if counters["successes"] else 0.0
+        return counters
+
+RAG_CLIENT = RagClient(RAG_URL, RAG_BATCH_URL)
+
+def get_api_response(question, img_url=None):
+    try:
+        data = RAG_CLIENT.search(question, img_url)
+
+        stats = RAG_CLIENT.stats()
+        if stats["requests"] % RAG_STATS_LOG_EVERY == 0:
+            log_activity(
+                f"📊 RAG: {stats['requests']} requests, {stats['error_rate']:.0%} errors, "
+                f"{stats['short_circuited']} short-circuited, avg {stats['latency_avg']:.2f}s, max {stats['latency_max']:.2f}s"
+            )
+
+        if not isinstance(data, dict):
+            return None
         message = data.get("answer", "We'll get back to you shortly.")
+        if not isinstance(message, str) or not message.strip():
+            log_error(f"❌ API response has no usable answer: {str(data)[:100]}")
+            return None
         log_activity(f"🔍 API response: {message[:60]}...")
         return message
     except Exception as e:
@@ -292,71 +1492,430 @@ def get_ai_response(driver):
         use_btn.click()
         log_activity("✅ Inserted AI-generated message.")
 
-        time.sleep(2)
         pre = driver.find_element(By.CSS_SELECTOR, "#send-box-wrapper pre")
-        ai_text = pre.get_attribute("textContent").strip()
+        ai_text = wait_until(driver, "ai_text", lambda d: pre.get_attribute("textContent").strip()) or ""
         log_activity(f"🤖 AI reply preview: {ai_text[:60]}...")
         return ai_text
     except Exception as e:
         log_activity("⚠️ AI Assistant fallback failed.")
         return None
 
-def generate_reply(driver, query, img_url):
-    reply = None
-    if USE_AI:
-        reply = get_api_response(query, img_url)
-    # if not reply or reply.strip() == "":
-    #     reply = get_ai_response(driver)
-    if not reply or reply.strip() == "":
-        reply = random.choice(REPLIES)
-    return reply
+# ------------------ REPLY CACHE ------------------
 
-def send_message(driver, recipient, message):
-    try:
-        if not is_session_valid(driver):
-            return False
-            
-        message_box = driver.find_element(By.CLASS_NAME, "send-textarea")
-        message_box.send_keys(Keys.CONTROL + "a")
-        time.sleep(0.5)
-        message_box.send_keys(Keys.BACKSPACE)
-        time.sleep(2)
-        message_box.send_keys(message)
-        time.sleep(random.uniform(1, 3))
-        send_button = driver.find_element(By.XPATH, "//button[contains(@class, 'send-tool-button')]")
-        send_button.click()
-        log_activity(f"✅ Sent message to {recipient}: {message}")
-        return True
-    except Exception as e:
-        log_error(f"❌ Error sending message to {recipient}: {str(e)}")
-        return False
+class ReplyCache:
+    """LRU + TTL cache of RAG replies, persisted to a JSON file between runs"""
 
-def extract_message_data(message_container):
-    try:
-        msg_type = json.loads(message_container.get_attribute("data-expinfo"))['messageType']
-        message_text = ''
-        image_url = None
-
-        if msg_type == 1:
-            message_text = message_container.find_element(By.CLASS_NAME, 'session-rich-content').text
-        elif msg_type in [2000, 60]:
-            image_element = message_container.find_element(By.XPATH, "//div[@view-name='ImageView']/div/img | //div/img")
-            image_url = image_element.get_attribute("src")
-            message_text = "details on this product"
-        elif msg_type in [50, 63]:
-            message_text = message_container.find_element(By.CLASS_NAME, 'description-container').text
-            image_element = message_container.find_element(By.XPATH, '//p/img')
-            image_url = image_element.get_attribute("src")
-        elif msg_type == 61:
-            file_details = json.loads(message_container.find_element(By.XPATH, '//div[@data-exp="card-file"]').get_attribute("data-query"))
-            message_text = f"File: {file_details.get('fileName')} ({file_details.get('fileSize')})"
-        elif msg_type == 57:
-            message_text = ''  # Skip business cards
-
-        return message_text, image_url
-    except Exception as e:
-        log_error(f"❌ Error extracting message data: {str(e)}")
-        return None, None
+    def __init__(self, path, max_entries, ttl):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.last_saved = time.time()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            now = time.time()
+            for key, (reply, stored_at) in stored:
+                if now - stored_at < self.ttl:
+                    self.entries[key] = (reply, stored_at)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            log_activity(f"🗃️ Loaded {len(self.entries)} cached replies.")
+        except (OSError, ValueError, TypeError) as e:
+            log_error(f"⚠️ Could not load reply cache: {str(e)}")
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = list(self.entries.items())
+            self.dirty = False
+            self.last_saved = time.time()
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log_error(f"⚠️ Could not save reply cache: {str(e)}")
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[1] >= self.ttl:
+                del self.entries[key]
+                self.dirty = True
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def contains(self, key):
+        """True if key holds a live reply; unlike get() it leaves hit stats and LRU order alone"""
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and time.time() - entry[1] < self.ttl
+
+    def put(self, key, reply):
+        with self.lock:
+            self.entries[key] = (reply, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+            due = time.time() - self.last_saved > REPLY_CACHE_SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+REPLY_CACHE = ReplyCache(REPLY_CACHE_FILE, REPLY_CACHE_MAX_ENTRIES, REPLY_CACHE_TTL)
+atexit.register(REPLY_CACHE.save)
+
+IMAGE_SESSION = requests.Session()
+IMAGE_FINGERPRINTS = OrderedDict()
+IMAGE_FINGERPRINTS_LOCK = threading.Lock()
+
+def normalize_query(query):
+    """Lowercase, drop punctuation and collapse whitespace so trivially different questions share a key"""
+    return " ".join(re.sub(r"[^\w\s]", " ", (query or "").lower()).split())
+
+def image_fingerprint(img_url):
+    """Content hash of the image behind img_url, so varying CDN URLs of one image share a key"""
+    if not img_url:
+        return ""
+    with IMAGE_FINGERPRINTS_LOCK:
+        if img_url in IMAGE_FINGERPRINTS:
+            IMAGE_FINGERPRINTS.move_to_end(img_url)
+            return IMAGE_FINGERPRINTS[img_url]
+    try:
+        response = IMAGE_SESSION.get(img_url, timeout=IMAGE_FETCH_TIMEOUT)
+        response.raise_for_status()
+        fingerprint = hashlib.sha256(response.content).hexdigest()[:32]
+    except requests.RequestException as e:
+        log_activity(f"⚠️ Could not fetch image for fingerprinting, keying on its URL: {str(e)}")
+        return "url:" + img_url.split("?")[0]
+    with IMAGE_FINGERPRINTS_LOCK:
+        IMAGE_FINGERPRINTS[img_url] = fingerprint
+        while len(IMAGE_FINGERPRINTS) > IMAGE_FINGERPRINT_MEMO_SIZE:
+            IMAGE_FINGERPRINTS.popitem(last=False)
+    return fingerprint
+
+def reply_cache_key(query, img_url):
+    return f"{normalize_query(query)}|{image_fingerprint(img_url)}"
+
+def get_cached_api_response(query, img_url=None):
+    """get_api_response() behind the persistent reply cache"""
+    key = reply_cache_key(query, img_url)
+    with PREFETCH_LOCK:
+        prefetch = PREFETCHES.pop(key, None)
+    if prefetch is not None:
+        # A speculative request for this query is in flight or done; wait for it instead of sending another
+        future, _ = prefetch
+        try:
+            reply = future.result().get(key)
+        except Exception as e:
+            # Fall through to a normal lookup
+            log_error(f"⚠️ Prefetched RAG request failed: {str(e)}")
+            reply = None
+        if reply:
+            REPLY_CACHE.put(key, reply)
+            inc_counter("alibaba_rag_prefetch_hits_total")
+            inc_counter("alibaba_replies_total", source="prefetch")
+            return reply
+    reply = REPLY_CACHE.get(key)
+    if reply is None:
+        with timed_stage("rag"):
+            reply = get_api_response(query, img_url)
+        if reply and reply.strip():
+            REPLY_CACHE.put(key, reply)
+            inc_counter("alibaba_replies_total", source="rag")
+    else:
+        log_activity(f"🗃️ Cached reply: {reply[:60]}...")
+        inc_counter("alibaba_replies_total", source="cache")
+
+    stats = REPLY_CACHE.stats()
+    if (stats["hits"] + stats["misses"]) % REPLY_CACHE_STATS_LOG_EVERY == 0:
+        log_activity(f"📊 Reply cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), {stats['entries']} entries")
+    return reply
+
+# Network I/O runs here so the thread that owns the driver never waits on it idle.
+# Only this module's thread-safe components (RAG client, reply cache, metrics) are used from the pool.
+IO_POOL = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="io")
+
+PREFETCHES = {}  # reply cache key -> (Future of the speculative batch request covering it, started at)
+PREFETCH_LOCK = threading.Lock()
+
+def preview_query(row):
+    """Text of an inbox row's preview, without leading tags such as "[Inquiry]"."""
+    return re.sub(r"^(\s*\[[^\]]*\])+\s*", "", row.get("preview") or "").strip()
+
+def fetch_replies(keyed_queries):
+    """Batch RAG for [(cache key, query)]; returns {cache key: answer} for the queries that got one.
+
+    Answers reach the reply cache and the reply counters only once a
+    conversation uses them, in get_cached_api_response().
+    """
+    results = RAG_CLIENT.search_batch([(query, None) for _, query in keyed_queries])
+    answers = {}
+    for (key, _), data in zip(keyed_queries, results):
+        answer = data.get("answer") if isinstance(data, dict) else None
+        if isinstance(answer, str) and answer.strip():
+            answers[key] = answer
+    return answers
+
+def prefetch_replies(rows):
+    """Speculatively start RAG for queued conversations from their inbox previews.
+
+    When the thread later yields the same query, get_cached_api_response()
+    waits on this request instead of sending its own. A preview that turns
+    out different only costs one unused answer, dropped after RAG_PREFETCH_TTL.
+    """
+    if not (USE_AI and RAG_PREFETCH):
+        return
+    keyed_queries = []
+    with PREFETCH_LOCK:
+        now = time.time()
+        for key in [key for key, (future, started) in PREFETCHES.items() if future.done() and now - started > RAG_PREFETCH_TTL]:
+            del PREFETCHES[key]
+        for row in rows:
+            query = preview_query(row)
+            if not query:
+                continue
+            key = reply_cache_key(query, None)
+            if key in PREFETCHES or any(key == queued for queued, _ in keyed_queries) or REPLY_CACHE.contains(key):
+                continue
+            keyed_queries.append((key, query))
+        if not keyed_queries:
+            return
+        future = IO_POOL.submit(fetch_replies, keyed_queries)
+        for key, _ in keyed_queries:
+            PREFETCHES[key] = (future, now)
+    inc_counter("alibaba_rag_prefetched_total", len(keyed_queries))
+    log_activity(f"🔮 Prefetching RAG answers for {len(keyed_queries)} queued conversations")
+
+def start_reply(query, img_url):
+    """Run generate_reply() on the IO pool; the driver stays with the calling thread"""
+    return IO_POOL.submit(generate_reply, None, query, img_url)
+
+def generate_reply(driver, query, img_url):
+    reply = None
+    if USE_AI:
+        reply = get_cached_api_response(query, img_url)
+    # if not reply or reply.strip() == "":
+    #     reply = get_ai_response(driver)
+    if not reply or reply.strip() == "":
+        reply = random.choice(REPLIES)
+        inc_counter("alibaba_replies_total", source="fallback")
+    return reply
+
+def send_message(driver, recipient, message):
+    return run_steps(send_message_steps(driver, recipient, message))
+
+def send_message_steps(driver, recipient, message):
+    try:
+        if not is_session_valid(driver):
+            return False
+            
+        message_box = wait_until(driver, "textarea", EC.element_to_be_clickable((By.CLASS_NAME, "send-textarea")))
+        if message_box is None:
+            log_error(f"❌ Message box never became ready for {recipient}")
+            return False
+        message_box.send_keys(Keys.CONTROL + "a")
+        message_box.send_keys(Keys.BACKSPACE)
+        yield human_delay("before_typing")
+        message_box.send_keys(message)
+        yield human_delay("before_send")
+
+        send_button = wait_until(driver, "send_button", send_button_enabled)
+        if send_button is None:
+            log_error(f"❌ Send button never became enabled for {recipient}")
+            return False
+        before = thread_message_count(driver)
+        click_through_dialogs(driver, send_button)
+
+        if wait_until(driver, "message_delivered", lambda d: thread_message_count(d) > before) is None:
+            log_activity(f"⚠️ Sent message to {recipient} but it did not show up in the thread yet.")
+        log_activity(f"✅ Sent message to {recipient}: {message}")
+        return True
+    except Exception as e:
+        log_error(f"❌ Error sending message to {recipient}: {str(e)}")
+        return False
+
+# Per-message fields: name -> (CSS selector scoped to the message node, property or attribute to read)
+MESSAGE_FIELDS = {
+    "text": (".session-rich-content", "innerText"),
+    "description": (".description-container", "innerText"),
+    "image": ("div[view-name='ImageView'] img", "src"),
+    "inline_image": ("p img", "src"),
+    "any_image": ("img", "src"),
+    "file": ("div[data-exp='card-file']", "data-query")
+}
+
+# Walks the thread from the newest message back to the cursor (or to our own last reply)
+# and returns the messages in between, oldest first, with MESSAGE_FIELDS read inside each node.
+# "stopped" tells whether the walk found that boundary, i.e. whether every message is new.
+THREAD_MESSAGES_JS = """
+var fields = arguments[0], cursor = arguments[1], ownKey = arguments[2], ownValue = arguments[3], limit = arguments[4];
+var nodes = document.querySelectorAll('div.scroll-box > [data-expinfo]');
+var messages = [], stopped = false;
+for (var i = nodes.length - 1; i >= 0 && messages.length < limit; i--) {
+    var node = nodes[i], expinfo = node.getAttribute('data-expinfo'), info = {};
+    try { info = JSON.parse(expinfo) || {}; } catch (e) {}
+    var id = info.msgId || info.messageId || info.id || info.uuid || null;
+    if ((cursor && id !== null && String(id) === cursor) || (ownKey && info[ownKey] === ownValue)) {
+        stopped = true;
+        break;
+    }
+    var values = {};
+    fields.forEach(function (field) {
+        var el = node.querySelector(field[1]);
+        values[field[0]] = el ? String(field[2] in el ? el[field[2]] : el.getAttribute(field[2]) || '') : null;
+    });
+    messages.unshift({expinfo: expinfo, type: info.messageType, fields: values});
+}
+// Reaching the start of the thread without a reply of ours means it is all buyer messages
+if (i < 0 && ownKey) {
+    stopped = true;
+}
+return {messages: messages, stopped: stopped};
+"""
+
+# Id of the newest thread message showing the given text (our reply), or null if none does or it has no id.
+# Matching on the text rather than taking the newest node keeps a buyer message that lands meanwhile unanswered.
+SENT_MESSAGE_ID_JS = """
+var text = arguments[0].replace(/\\s+/g, ' ').trim(), limit = arguments[1];
+var nodes = document.querySelectorAll('div.scroll-box > [data-expinfo]');
+for (var i = nodes.length - 1; i >= 0 && i >= nodes.length - limit; i--) {
+    if ((nodes[i].innerText || '').replace(/\\s+/g, ' ').trim() !== text) {
+        continue;
+    }
+    var info = {};
+    try { info = JSON.parse(nodes[i].getAttribute('data-expinfo')) || {}; } catch (e) {}
+    var id = info.msgId || info.messageId || info.id || info.uuid || null;
+    return id === null ? null : String(id);
+}
+return null;
+"""
+
+def sent_message_id(driver, text):
+    try:
+        return driver.execute_script(SENT_MESSAGE_ID_JS, text, THREAD_SCAN_LIMIT)
+    except InvalidSessionIdException:
+        raise
+    except WebDriverException:
+        return None
+
+def text_message(fields):
+    return fields["text"] or "", None
+
+def image_message(fields):
+    return "details on this product", fields["image"] or fields["any_image"]
+
+def product_message(fields):
+    return fields["description"] or "", fields["inline_image"] or fields["any_image"]
+
+def file_message(fields):
+    file_details = json.loads(fields["file"] or "{}")
+    return f"File: {file_details.get('fileName')} ({file_details.get('fileSize')})", None
+
+def business_card_message(fields):
+    return "", None  # Skip business cards
+
+# messageType -> handler(fields) returning (message_text, image_url)
+MESSAGE_HANDLERS = {
+    1: text_message,
+    50: product_message,
+    63: product_message,
+    57: business_card_message,
+    60: image_message,
+    2000: image_message,
+    61: file_message
+}
+
+def extract_message_data(message):
+    """(message_text, image_url) of one message as returned by THREAD_MESSAGES_JS"""
+    try:
+        handler = MESSAGE_HANDLERS.get(int(message["type"]))
+        if handler is None:
+            return "", None
+        return handler(message["fields"])
+    except Exception as e:
+        log_error(f"❌ Error extracting message data: {str(e)}")
+        return None, None
+
+def thread_cursor(recipient):
+    """The recipient's cursor if THREAD_MESSAGES_JS can stop at it, else None"""
+    cursor = PROCESSED_INDEX.cursor(recipient)
+    if cursor and cursor.startswith(("row:", "h:")):
+        return None  # Row placeholders and content hashes never match a msgId
+    return cursor
+
+def extract_new_messages(driver, recipient, trace=None):
+    """Messages in the open thread that are newer than the recipient's cursor, oldest first.
+
+    The cursor is our last reply in this conversation (see ProcessedIndex). Without one
+    the script cannot tell new messages from our earlier replies and old
+    history (unless OWN_MESSAGE_EXPINFO is set), so only the newest message is
+    returned. Each message is a dict with id, type, text and img. Returns None
+    if the thread could not be read. The raw script result is kept in
+    trace["thread"] when tracing.
+    """
+    spec = [[name, selector, attribute] for name, (selector, attribute) in MESSAGE_FIELDS.items()]
+    cursor = thread_cursor(recipient)
+    own_key, own_value = OWN_MESSAGE_EXPINFO or (None, None)
+    try:
+        raw = driver.execute_script(THREAD_MESSAGES_JS, spec, cursor, own_key, own_value, THREAD_SCAN_LIMIT)
+    except InvalidSessionIdException:
+        raise
+    except WebDriverException as e:
+        log_activity(f"⚠️ Could not read the conversation thread: {str(e)}")
+        return None
+    if trace is not None:
+        trace["thread"] = raw
+
+    raw = raw or {}
+    raw_messages = raw.get("messages") or []
+    if not raw.get("stopped"):
+        raw_messages = raw_messages[-1:]
+
+    messages = []
+    for message in raw_messages:
+        fields = message.get("fields") or {}
+        message_id = message_identity(message.get("expinfo"), json.dumps(fields, sort_keys=True))
+        if PROCESSED_INDEX.has_message(recipient, message_id):
+            # Ids without a msgId are content hashes the script cannot stop at
+            messages = []
+            continue
+        text, img_url = extract_message_data(message)
+        messages.append({"id": message_id, "type": message.get("type"), "text": text, "img": img_url})
+    return messages
+
+def thread_query(messages):
+    """RAG query and image of a run of new messages: all their texts, and the latest image"""
+    texts = [message["text"].strip() for message in messages if message["text"] and message["text"].strip()]
+    images = [message["img"] for message in messages if message["img"]]
+    return "\n".join(texts) or "New message", images[-1] if images else None
 
 def safe_find_element(element, by, value, default=""):
     """Safely find an element and return its text, or default value if not found"""
@@ -368,103 +1927,1192 @@ def safe_find_element(element, by, value, default=""):
 def safe_find_elements(driver_or_element, by, value):
     """Safely find elements and return the list, or empty list if not found"""
     try:
-        if not is_session_valid(driver_or_element) if hasattr(driver_or_element, 'current_url') else True:
+        if hasattr(driver_or_element, 'current_url') and not is_session_valid(driver_or_element):
             return []
         return driver_or_element.find_elements(by, value)
     except (NoSuchElementException, StaleElementReferenceException, InvalidSessionIdException):
         return []
 
-def check_if_inquiry(container):
-    """Check if message is an inquiry with proper error handling"""
-    try:
-        # Try multiple possible selectors for the message type
-        selectors_to_try = [
-            'latest-msg-oneline',
-            'latest-msg',
-            'msg-content',
-            'message-content',
-            'session-content'
-        ]
-        
-        message_text = ""
-        for selector in selectors_to_try:
-            try:
-                element = container.find_element(By.CLASS_NAME, selector)
-                message_text = element.text.strip()
-                break
-            except NoSuchElementException:
-                continue
-        
-        # Check if it's an inquiry based on text content
-        inquiry_keywords = ["[Inquiry]", "[Product]", "inquiry", "product"]
-        return any(keyword.lower() in message_text.lower() for keyword in inquiry_keywords)
-        
-    except Exception as e:
-        log_activity(f"⚠️ Could not determine if message is inquiry: {str(e)}")
-        return False
+def parse_text(value):
+    return value.strip()
+
+def parse_count(value):
+    """Parse indicator counts such as '1,234', '56+' or '1.2k' into an int"""
+    value = value.strip().lower().replace(",", "").rstrip("+")
+    multiplier = 1
+    if value.endswith("k"):
+        value, multiplier = value[:-1], 1000
+    return int(float(value) * multiplier)
+
+# Buyer profile fields: name -> (CSS selector, index among matches, parser, default)
+PROFILE_FIELDS = {
+    "user": (".name-text", 0, parse_text, "Unknown User"),
+    "country": (".country-flag-label", 0, parse_text, "Unknown Country"),
+    "company": ("div.base-information-form-item-content > span", 0, parse_text, ""),
+    "email": ("div.base-information-form-item-content > span", 1, parse_text, ""),
+    "registration_date": ("div.base-information-form-item-content > span", 2, parse_text, ""),
+    "product_views_count": ("div.product-visit.indicator > div.count", 0, parse_count, 0),
+    "inquiries_count": ("div.inquiries-count.indicator > div.count", 0, parse_count, 0),
+    "available_rfq_count": ("div.availble-rfq.indicator > div.count", 0, parse_count, 0),
+    "login_days_count": ("div.landing-days.indicator > div.count", 0, parse_count, 0),
+    "spam_inquiries_count": ("div.trash-inquires.indicator > div.count", 0, parse_count, 0),
+    "blacklist_count": ("div.add-blacklist.indicator > div.count", 0, parse_count, 0)
+}
+
+# Reads the text of every requested [name, selector, index] in one call; missing elements map to null.
+EXTRACT_FIELDS_JS = """
+var result = {};
+arguments[0].forEach(function (field) {
+    var el = document.querySelectorAll(field[1])[field[2]];
+    result[field[0]] = el ? (el.innerText || el.textContent || '') : null;
+});
+return result;
+"""
+
+def extract_profile(driver, fields=PROFILE_FIELDS):
+    """Read all buyer profile fields in a single WebDriver round trip"""
+    spec = [[name, selector, index] for name, (selector, index, _, _) in fields.items()]
+    try:
+        raw = driver.execute_script(EXTRACT_FIELDS_JS, spec) or {}
+    except InvalidSessionIdException:
+        raise
+    except WebDriverException as e:
+        log_activity(f"⚠️ Could not extract buyer profile: {str(e)}")
+        raw = {}
+
+    profile = {}
+    for name, (_, _, parser, default) in fields.items():
+        value = raw.get(name)
+        try:
+            profile[name] = parser(value) if value is not None and value.strip() else default
+        except ValueError:
+            profile[name] = default
+    return profile
+
+def profile_loaded(profile):
+    """False when the profile panel had not rendered the buyer yet"""
+    return bool(profile) and profile["user"] != PROFILE_FIELDS["user"][3]
 
-def store_inquiry(driver, img_url):
+def store_inquiry(driver, img_url, profile=None, trace=None):
     try:
         if not is_session_valid(driver):
             return False
             
-        user = safe_find_element(driver, By.CSS_SELECTOR, ".name-text", "Unknown User")
-        country = safe_find_element(driver, By.CSS_SELECTOR, ".country-flag-label", "Unknown Country")
-        
-        info_array = safe_find_elements(driver, By.CSS_SELECTOR, "div.base-information-form-item-content > span")
-        company = info_array[0].text.strip() if len(info_array) > 0 else ""
-        email = info_array[1].text.strip() if len(info_array) > 1 else ""
-        registration_date = info_array[2].text.strip() if len(info_array) > 2 else ""
-
-        product_views_count = safe_find_element(driver, By.CSS_SELECTOR, "div.product-visit.indicator > div.count", "0")
-        inquiries_count = safe_find_element(driver, By.CSS_SELECTOR, "div.inquiries-count.indicator > div.count", "0")
-        available_rfq_count = safe_find_element(driver, By.CSS_SELECTOR, "div.availble-rfq.indicator > div.count", "0")
-        login_days_count = safe_find_element(driver, By.CSS_SELECTOR, "div.landing-days.indicator > div.count", "0")
-        spam_inquiries_count = safe_find_element(driver, By.CSS_SELECTOR, "div.trash-inquires.indicator > div.count", "0")
-        blacklist_count = safe_find_element(driver, By.CSS_SELECTOR, "div.add-blacklist.indicator > div.count", "0")
-        
+        # Re-read the panel if the profile scraped while RAG was in flight came too early
+        if not profile_loaded(profile):
+            profile = extract_profile(driver)
+
         follow_up_date = (datetime.today() + timedelta(days=3)).strftime('%Y-%m-%d')
-        inquiry_id = f"INQ-{int(time.time())}"
+        inquiry_id = new_inquiry_id()
         count = 1
 
-        # Send to n8n webhook
-        webhook_url = "https://n8n.ecowoodies.com/webhook/alibabadumping"  # Replace with actual URL
-        payload = {
-            "inquiry_id": inquiry_id,
-            "user": user,
-            "country": country,
-            "company": company,
-            "email": email,
-            "registration_date": registration_date,
-            "product_views_count": product_views_count,
-            "inquiries_count": inquiries_count,
-            "available_rfq_count": available_rfq_count,
-            "login_days_count": login_days_count,
-            "spam_inquiries_count": spam_inquiries_count,
-            "blacklist_count": blacklist_count,
+        payload = {"inquiry_id": inquiry_id}
+        payload.update(profile)
+        payload.update({
             "follow_up_date": follow_up_date,
             "count": count,
             "img": img_url
-        }
+        })
 
-        try:
-            response = requests.post(webhook_url, json=payload, timeout=10)
-            if response.status_code == 200:
-                log_activity(f"📡 Inquiry {inquiry_id} sent to webhook.")
-            else:
-                log_error(f"❌ Failed to send inquiry to webhook: {response.text}")
-        except requests.exceptions.RequestException as e:
-            log_error(f"❌ Webhook request failed: {str(e)}")
-        
+        INQUIRY_LEDGER.record(payload)
+        if trace is not None:
+            trace["webhook"] = payload
+        # Delivered to the n8n webhook in the background
+        if WEBHOOK_OUTBOX.enqueue(payload):
+            log_activity(f"📥 Inquiry {inquiry_id} queued for webhook delivery.")
         return True
 
     except Exception as e:
         log_error(f"❌ Error storing/sending inquiry: {str(e)}")
         return False
 
+# ------------------ WEBHOOK OUTBOX ------------------
+
+def new_inquiry_id():
+    """Unique inquiry id; the random suffix keeps ids distinct within the same second"""
+    return f"INQ-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+
+class WebhookOutbox:
+    """Durable SQLite queue of webhook payloads, delivered by a background worker.
+
+    Entries are keyed on inquiry_id, so enqueueing the same inquiry twice is a
+    no-op and the id doubles as an Idempotency-Key header for the receiver.
+    """
+
+    def __init__(self, path, url):
+        self.path = path
+        self.url = url
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.worker = None
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " inquiry_id TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt_at REAL NOT NULL,"
+                " delivered_at REAL,"
+                " last_error TEXT)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (delivered_at, next_attempt_at)")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def enqueue(self, payload):
+        """Persist a payload for delivery. Returns False if the inquiry was already queued."""
+        now = time.time()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO outbox (inquiry_id, payload, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                (payload["inquiry_id"], json.dumps(payload), now, now)
+            )
+        self.wake.set()
+        return cursor.rowcount == 1
+
+    def pending_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox WHERE delivered_at IS NULL").fetchone()[0]
+
+    def start(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._run, name="webhook-outbox", daemon=True)
+            self.worker.start()
+            pending = self.pending_count()
+            if pending:
+                log_activity(f"📤 Webhook outbox started with {pending} pending inquiries.")
+
+    def _run(self):
+        while True:
+            try:
+                delivered = self.deliver_due()
+            except Exception as e:
+                log_error(f"❌ Webhook outbox worker error: {str(e)}")
+                delivered = 0
+            if not delivered:
+                self.wake.wait(OUTBOX_POLL_INTERVAL)
+                self.wake.clear()
+
+    def deliver_due(self):
+        """Attempt one batch of due deliveries over the pooled session; returns how many succeeded"""
+        now = time.time()
+        with self.lock:
+            due = self.conn.execute(
+                "SELECT inquiry_id, payload, attempts FROM outbox"
+                " WHERE delivered_at IS NULL AND next_attempt_at <= ?"
+                " ORDER BY created_at LIMIT ?",
+                (now, OUTBOX_BATCH_SIZE)
+            ).fetchall()
+
+        delivered = 0
+        for inquiry_id, payload, attempts in due:
+            error = None
+            start = time.time()
+            try:
+                response = self.session.post(
+                    self.url,
+                    data=payload,
+                    headers={"Content-Type": "application/json", "Idempotency-Key": inquiry_id},
+                    timeout=(WEBHOOK_CONNECT_TIMEOUT, WEBHOOK_READ_TIMEOUT)
+                )
+                if not 200 <= response.status_code < 300:
+                    error = f"HTTP {response.status_code}: {response.text[:200]}"
+            except requests.RequestException as e:
+                error = str(e)
+
+            with self.lock, self.conn:
+                if error is None:
+                    self.conn.execute("UPDATE outbox SET delivered_at = ?, attempts = ? WHERE inquiry_id = ?",
+                                      (time.time(), attempts + 1, inquiry_id))
+                else:
+                    delay = min(OUTBOX_RETRY_BACKOFF * (2 ** attempts), OUTBOX_MAX_BACKOFF) * random.uniform(0.8, 1.2)
+                    self.conn.execute("UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE inquiry_id = ?",
+                                      (attempts + 1, time.time() + delay, error, inquiry_id))
+            observe("alibaba_webhook_delivery_seconds", time.time() - start)
+            inc_counter("alibaba_webhook_deliveries_total", result="ok" if error is None else "error")
+            if error is None:
+                delivered += 1
+                log_activity(f"📡 Inquiry {inquiry_id} sent to webhook.")
+            else:
+                log_error(f"❌ Webhook delivery of {inquiry_id} failed (attempt {attempts + 1}): {error}")
+
+        if delivered:
+            with self.lock, self.conn:
+                self.conn.execute("DELETE FROM outbox WHERE delivered_at < ?", (time.time() - OUTBOX_RETENTION,))
+        return delivered
+
+WEBHOOK_OUTBOX = None
+
+def open_webhook_outbox():
+    """The webhook outbox, created on first use so that importing app.py touches no files"""
+    global WEBHOOK_OUTBOX
+    if WEBHOOK_OUTBOX is None:
+        WEBHOOK_OUTBOX = WebhookOutbox(OUTBOX_DB, WEBHOOK_URL)
+    return WEBHOOK_OUTBOX
+
+# ------------------ INQUIRY LEDGER ------------------
+
+# Columns of exported inquiries, in order; missing payload fields export as empty cells
+EXPORT_COLUMNS = [
+    "inquiry_id", "created_at", "user", "country", "company", "email", "registration_date",
+    "product_views_count", "inquiries_count", "available_rfq_count", "login_days_count",
+    "spam_inquiries_count", "blacklist_count", "follow_up_date", "count", "img"
+]
+
+class InquiryLedger:
+    """Append-only SQLite record of every stored inquiry, independent of webhook delivery.
+
+    Rows are never updated or deleted; the rowid orders them, so an export only
+    has to remember the last rowid it wrote to resume from there.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS inquiries ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " inquiry_id TEXT UNIQUE NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " date TEXT NOT NULL,"
+                " email TEXT,"
+                " company TEXT,"
+                " payload TEXT NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS inquiries_email ON inquiries (email)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS inquiries_company ON inquiries (company)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS inquiries_date ON inquiries (date)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS exports ("
+                " target TEXT PRIMARY KEY,"
+                " last_id INTEGER NOT NULL,"
+                " exported_at REAL NOT NULL)"
+            )
+
+    def record(self, payload):
+        """Append an inquiry. Returns False if its inquiry_id was already recorded."""
+        now = time.time()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO inquiries (inquiry_id, created_at, date, email, company, payload)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (payload["inquiry_id"], now, datetime.fromtimestamp(now).strftime('%Y-%m-%d'),
+                 payload.get("email") or None, payload.get("company") or None, json.dumps(payload, ensure_ascii=False))
+            )
+        return cursor.rowcount == 1
+
+    def last_exported(self, target):
+        with self.lock:
+            row = self.conn.execute("SELECT last_id FROM exports WHERE target = ?", (target,)).fetchone()
+        return row[0] if row else 0
+
+    def mark_exported(self, target, last_id):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO exports (target, last_id, exported_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(target) DO UPDATE SET last_id = excluded.last_id, exported_at = excluded.exported_at",
+                (target, last_id, time.time())
+            )
+
+    def iter_since(self, after_id):
+        """Yield (id, row values in EXPORT_COLUMNS order) after after_id, fetched in chunks.
+
+        Uses its own connection so a long export never holds the lock the
+        bot's writes go through.
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            cursor = conn.execute(
+                "SELECT id, created_at, payload FROM inquiries WHERE id > ? ORDER BY id", (after_id,)
+            )
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+                if not rows:
+                    return
+                for row_id, created_at, payload in rows:
+                    data = json.loads(payload)
+                    data["created_at"] = datetime.fromtimestamp(created_at).strftime('%Y-%m-%d %H:%M:%S')
+                    yield row_id, [data.get(column, "") for column in EXPORT_COLUMNS]
+        finally:
+            conn.close()
+
+INQUIRY_LEDGER = None
+
+def open_inquiry_ledger():
+    """The inquiry ledger, created on first use so that importing app.py touches no files"""
+    global INQUIRY_LEDGER
+    if INQUIRY_LEDGER is None:
+        INQUIRY_LEDGER = InquiryLedger(INQUIRY_LEDGER_DB)
+    return INQUIRY_LEDGER
+
+def export_inquiries(path, full=False):
+    """Stream the ledger into a .csv or .xlsx file with constant memory.
+
+    By default only inquiries added since the previous export to the same path
+    are written. A CSV is appended to in place. A write-only workbook cannot be
+    reopened, so an incremental .xlsx export next to an existing one goes to a
+    new timestamped file (leads-YYYYmmdd-HHMMSS.xlsx) holding just the new rows.
+    With full, everything is exported and the file replaced.
+    Returns the number of rows written.
+    """
+    ledger = open_inquiry_ledger()
+    target = os.path.abspath(path)
+    after_id = 0 if full else ledger.last_exported(target)
+    rows = ledger.iter_since(after_id)
+    last_id = after_id
+    written = 0
+
+    if target.lower().endswith(".xlsx"):
+        first = next(rows, None)
+        if first is None and not full:
+            log_activity(f"📤 No new inquiries to export to {target}")
+            return 0
+        output = target
+        if not full and os.path.exists(target):
+            output = f"{target[:-5]}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.xlsx"
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Inquiries")
+        sheet.append(EXPORT_COLUMNS)
+        for last_id, values in itertools.chain([first] if first else [], rows):
+            sheet.append(values)
+            written += 1
+        workbook.save(output)
+        log_activity(f"📤 Exported {written} inquiries to {output}")
+    else:
+        append = not full and os.path.exists(target)
+        with open(target, "a" if append else "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if not append:
+                writer.writerow(EXPORT_COLUMNS)
+            for last_id, values in rows:
+                writer.writerow(values)
+                written += 1
+        log_activity(f"📤 Exported {written} inquiries to {target}")
+
+    ledger.mark_exported(target, last_id)
+    return written
+
+# ------------------ NEW MESSAGE DETECTION ------------------
+
+# Installed on every document so it survives driver.get()/refresh(). Records a
+# DOM event whenever a conversation's unread badge appears or its count grows.
+UNREAD_OBSERVER_JS = """
+(function () {
+    if (window.__imObserverInstalled) { return; }
+    window.__imObserverInstalled = true;
+    window.__imEvents = window.__imEvents || [];
+    var last = {};
+    var scheduled = false;
+    var scan = function () {
+        scheduled = false;
+        var current = {};
+        var fresh = [];
+        document.querySelectorAll('div[data-name] .unread-num').forEach(function (badge) {
+            var row = badge.closest('div[data-name]');
+            var name = row.getAttribute('data-name');
+            current[name] = parseInt(badge.textContent, 10) || 1;
+            if (current[name] > (last[name] || 0)) {
+                fresh.push({source: 'dom', name: name, unread: current[name], at: Date.now() / 1000});
+            }
+        });
+        last = current;
+        if (fresh.length) {
+            Array.prototype.push.apply(window.__imEvents, fresh);
+            if (window.__imNotify) { window.__imNotify(); }
+        }
+    };
+    new MutationObserver(function () {
+        if (!scheduled) { scheduled = true; setTimeout(scan, 100); }
+    }).observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+})();
+"""
+
+# Resolves as soon as the observer records an event, or with an empty list after the timeout.
+WAIT_FOR_DOM_EVENTS_JS = """
+var done = arguments[arguments.length - 1];
+var take = function () { var events = window.__imEvents || []; window.__imEvents = []; return events; };
+var pending = take();
+if (pending.length) { return done(pending); }
+var timer = setTimeout(function () { window.__imNotify = null; done(take()); }, arguments[0]);
+window.__imNotify = function () { clearTimeout(timer); window.__imNotify = null; done(take()); };
+"""
+
+def is_new_message_frame(payload):
+    """Check if a WebSocket frame payload looks like a new-message push"""
+    return bool(payload) and any(keyword in payload for keyword in IM_FRAME_KEYWORDS)
+
+def on_websocket_frame(message):
+    payload = message.get("params", {}).get("response", {}).get("payloadData", "")
+    if is_new_message_frame(payload):
+        NEW_MESSAGE_EVENTS.put({"source": "ws", "at": time.time()})
+
+def on_network_response(message):
+    response = message.get("params", {}).get("response", {})
+    url = response.get("url", "")
+    if message.get("params", {}).get("type") in ("XHR", "Fetch") and any(keyword in url for keyword in IM_XHR_URL_KEYWORDS):
+        NEW_MESSAGE_EVENTS.put({"source": "xhr", "url": url, "at": time.time()})
+
+def start_push_detection(driver):
+    """Subscribe to the page's IM traffic and install the unread-badge observer"""
+    try:
+        driver.add_cdp_listener("Network.webSocketFrameReceived", on_websocket_frame)
+        driver.add_cdp_listener("Network.responseReceived", on_network_response)
+    except Exception as e:
+        log_activity(f"⚠️ CDP listeners unavailable, relying on DOM events: {str(e)}")
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": UNREAD_OBSERVER_JS})
+        driver.execute_script(UNREAD_OBSERVER_JS)
+        driver.set_script_timeout(PUSH_WAIT_SLICE + 5)
+        log_activity("📡 Push detection enabled.")
+    except Exception as e:
+        log_error(f"⚠️ Could not install unread observer: {str(e)}")
+
+def take_new_message_events():
+    events = []
+    while True:
+        try:
+            events.append(NEW_MESSAGE_EVENTS.get_nowait())
+        except queue.Empty:
+            return events
+
+def wait_for_new_messages(driver, timeout):
+    """Block until a new-message event arrives or the timeout expires; returns the events.
+
+    In poll mode this is a plain sleep. In push mode CDP events are picked up
+    from NEW_MESSAGE_EVENTS and DOM events are awaited in-page, in short slices
+    so that CDP events are never held back for long.
+    """
+    if DETECTION_MODE != "push":
+        time.sleep(timeout)
+        return []
+
+    deadline = time.time() + timeout
+    while True:
+        events = take_new_message_events()
+        remaining = deadline - time.time()
+        if events or remaining <= 0:
+            return events
+        try:
+            dom_events = driver.execute_async_script(WAIT_FOR_DOM_EVENTS_JS, int(min(remaining, PUSH_WAIT_SLICE) * 1000))
+        except TimeoutException:
+            dom_events = []
+        for event in dom_events or []:
+            NEW_MESSAGE_EVENTS.put(event)
+
+def next_poll_interval(current, busy):
+    """Tighten the fallback poll interval while busy, back off while idle"""
+    if busy:
+        return POLL_INTERVAL_MIN
+    return min(current * POLL_BACKOFF_FACTOR, POLL_INTERVAL_MAX)
+
+# ------------------ NAVIGATION ------------------
+
+PAGE_INBOX = "inbox"
+PAGE_CONVERSATION = "conversation"
+PAGE_PROFILE_PANEL = "profile_panel"
+PAGE_DIALOG = "dialog"
+PAGE_INVALID = "invalid"
+
+OPEN_THREADS = {}  # window handle -> (recipient, is_inquiry) of the conversation that tab was left on
+
+# Reads everything needed to classify the PWA's current state in one call.
+PAGE_STATE_JS = """
+var visible = function (selector) {
+    var el = document.querySelector(selector);
+    return !!(el && (el.offsetParent !== null || getComputedStyle(el).position === 'fixed'));
+};
+return {
+    shell: !!document.querySelector(arguments[0]),
+    rows: document.querySelectorAll('div[data-name]').length,
+    thread: document.querySelectorAll('div.scroll-box > *').length,
+    profile: visible('div.base-information-form-item-content'),
+    dialog: visible('.im-next-dialog') || visible('.im-next-dialog-close')
+};
+"""
+
+# Marks the nodes of the currently shown thread, so a freshly opened conversation can be told apart.
+MARK_THREAD_STALE_JS = """
+document.querySelectorAll('div.scroll-box > *').forEach(function (el) { el.setAttribute('data-bot-stale', '1'); });
+"""
+
+NEW_THREAD_RENDERED_JS = """
+return document.querySelectorAll('div.scroll-box > *').length > 0 &&
+    document.querySelector('div.scroll-box > [data-bot-stale]') === null;
+"""
+
+def classify_page_state(info):
+    """Map a PAGE_STATE_JS reading to one of the PAGE_* states"""
+    if not info:
+        return PAGE_INVALID
+    if info.get("dialog"):
+        return PAGE_DIALOG
+    if info.get("rows", 0) == 0:
+        # An empty inbox is fine as long as the page itself rendered
+        return PAGE_INBOX if info.get("shell") else PAGE_INVALID
+    if info.get("profile"):
+        return PAGE_PROFILE_PANEL
+    if info.get("thread", 0) > 0:
+        return PAGE_CONVERSATION
+    return PAGE_INBOX
+
+def detect_page_state(driver):
+    try:
+        return classify_page_state(driver.execute_script(PAGE_STATE_JS, INBOX_SHELL_SELECTOR))
+    except InvalidSessionIdException:
+        raise
+    except WebDriverException:
+        return PAGE_INVALID
+
+def close_dialogs(driver):
+    """Close OneTalk pop-ups and dialogs"""
+    for class_name in ("im-next-dialog-close", "close-icon"):
+        try:
+            close_pop = safe_find_elements(driver, By.CLASS_NAME, class_name)
+            if close_pop:
+                close_pop[0].click()
+                log_activity("🔒 Closed pop-up.")
+        except Exception as e:
+            log_activity(f"⚠️ Could not close pop-up ({class_name}): {str(e)}")
+
+def click_through_dialogs(driver, element):
+    """Click element; if a pop-up intercepts the click, close it and click once more"""
+    try:
+        element.click()
+    except ElementClickInterceptedException:
+        close_dialogs(driver)
+        element.click()
+
+def hard_reload(driver, reason):
+    """Full reload of the PWA, only used when the in-app state cannot be trusted"""
+    global LAST_HARD_RELOAD
+    log_activity(f"🔄 Reloading main page ({reason}).")
+    start = time.time()
+    try:
+        OPEN_THREADS.pop(driver.current_window_handle, None)
+    except WebDriverException:
+        pass
+    driver.get(MAIN_URL)
+    wait_for_conversation_list(driver, timeout=30)
+    NAV_STATS["hard"] += 1
+    NAV_STATS["hard_seconds"] += time.time() - start
+    inc_counter("alibaba_page_reloads_total", reason=reason)
+    observe("alibaba_page_reload_seconds", time.time() - start)
+    LAST_HARD_RELOAD = time.time()
+
+def ensure_inbox(driver, max_steps=3, after_conversation=False):
+    """Bring the PWA to a state where the conversation list is usable.
+
+    Inbox, conversation and profile-panel states all keep the list on screen,
+    so moving to the next conversation needs no navigation at all. A thread
+    left open is watched by open_thread_followups() instead. Dialogs are
+    closed in place; only an invalid state triggers a hard reload.
+    after_conversation marks the calls that used to reload MAIN_URL, so only
+    those count as in-app navigations in NAV_STATS.
+    """
+    for _ in range(max_steps):
+        state = detect_page_state(driver)
+        if state in (PAGE_INBOX, PAGE_CONVERSATION, PAGE_PROFILE_PANEL):
+            if after_conversation:
+                NAV_STATS["soft"] += 1
+                inc_counter("alibaba_in_app_navigations_total")
+            return state
+        if state == PAGE_DIALOG:
+            close_dialogs(driver)
+            continue
+        hard_reload(driver, "invalid page state")
+    return detect_page_state(driver)
+
+def open_conversation(driver, recipient):
+    """Switch to a conversation inside the SPA. Returns False if it is no longer unread."""
+    message_element = find_unread_badge(driver, recipient)
+    if message_element is None:
+        return False
+    driver.execute_script(MARK_THREAD_STALE_JS)
+    click_through_dialogs(driver, message_element)
+    if wait_until(driver, "conversation_open", lambda d: d.execute_script(NEW_THREAD_RENDERED_JS)) is None:
+        log_activity(f"⚠️ Conversation with {recipient} did not render in time.")
+    return True
+
+def navigation_summary():
+    hard, soft = NAV_STATS["hard"], NAV_STATS["soft"]
+    avg_reload = NAV_STATS["hard_seconds"] / hard if hard else 0.0
+    return f"{soft} in-app transitions, {hard} reloads (avg {avg_reload:.1f}s), ~{soft * avg_reload:.0f}s saved"
+
+# ------------------ PROCESSED INDEX ------------------
+
+def row_signature(row):
+    """Fingerprint of what an inbox row shows; it changes whenever a new message lands"""
+    parts = [row.get("id"), row.get("last_msg_id"), row.get("preview"), row.get("time"), row.get("unread")]
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+
+def message_identity(expinfo_json, fallback_text=""):
+    """Stable id of a thread message from its data-expinfo, falling back to a content hash"""
+    try:
+        expinfo = json.loads(expinfo_json or "{}")
+    except ValueError:
+        expinfo = {}
+    for key in ("msgId", "messageId", "id", "uuid"):
+        if expinfo.get(key):
+            return str(expinfo[key])
+    return "h:" + hashlib.sha1(f"{expinfo_json}|{fallback_text}".encode("utf-8")).hexdigest()[:16]
+
+class ProcessedIndex:
+    """Append-only, compacting record of handled messages and the inbox rows they came from.
+
+    Lookups are dict-based. Messages are keyed on recipient plus message id; rows
+    remember the signature they had when handled, so an unchanged row can be
+    skipped without opening the conversation. Each recipient has a cursor,
+    the thread message extraction reads forward from: normally our own latest
+    reply, so it is never taken for a new buyer message.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.messages = {}
+        self.rows = {}
+        self.cursors = {}
+        self.log_lines = 0
+        self.last_compacted = time.time()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        cutoff = time.time() - PROCESSED_INDEX_RETENTION
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self.log_lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry["t"] < cutoff:
+                        continue
+                    self.messages[(entry["r"], entry["m"])] = entry["t"]
+                    if entry["t"] >= self.cursors.get(entry["r"], (None, 0))[1]:
+                        self.cursors[entry["r"]] = (entry.get("c", entry["m"]), entry["t"])
+                    if entry.get("s"):
+                        self.rows[entry["r"]] = (entry["s"], entry["t"])
+            log_activity(f"🗂️ Loaded {len(self.messages)} handled messages.")
+        except OSError as e:
+            log_error(f"⚠️ Could not load processed index: {str(e)}")
+
+    def has_message(self, recipient, message_id):
+        return (recipient, message_id) in self.messages
+
+    def cursor(self, recipient):
+        """Id of the thread message new messages in this conversation follow, or None"""
+        cursor = self.cursors.get(recipient)
+        return (cursor[0] or None) if cursor else None
+
+    def row_handled(self, recipient, row):
+        """True if this row shows nothing newer than what was already answered"""
+        if row.get("last_msg_id"):
+            return self.has_message(recipient, str(row["last_msg_id"]))
+        handled = self.rows.get(recipient)
+        return bool(handled) and handled[0] == row_signature(row) and time.time() - handled[1] < PROCESSED_ROW_TTL
+
+    def mark(self, recipient, message_id, row=None, cursor=None):
+        """Record message_id as handled and move the cursor to cursor (message_id by default; "" for none)"""
+        now = time.time()
+        if cursor is None:
+            cursor = message_id
+        entry = {"r": recipient, "m": message_id, "t": round(now, 3)}
+        if cursor != message_id:
+            entry["c"] = cursor
+        if row is not None:
+            entry["s"] = row_signature(row)
+        with self.lock:
+            self.messages[(recipient, message_id)] = now
+            self.cursors[recipient] = (cursor, now)
+            if row is not None:
+                self.rows[recipient] = (entry["s"], now)
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.log_lines += 1
+            except OSError as e:
+                log_error(f"⚠️ Could not append to processed index: {str(e)}")
+            # Every answered message adds a new key, so the slack check alone would never fire in a steady run
+            if (self.log_lines > 2 * len(self.messages) + PROCESSED_INDEX_COMPACT_SLACK
+                    or now - self.last_compacted > PROCESSED_INDEX_COMPACT_INTERVAL):
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the log with only live entries; caller holds the lock"""
+        self.last_compacted = time.time()
+        cutoff = self.last_compacted - PROCESSED_INDEX_RETENTION
+        self.messages = {key: t for key, t in self.messages.items() if t >= cutoff}
+        self.rows = {recipient: value for recipient, value in self.rows.items() if value[1] >= cutoff}
+        self.cursors = {recipient: value for recipient, value in self.cursors.items() if value[1] >= cutoff}
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for (recipient, message_id), t in self.messages.items():
+                    entry = {"r": recipient, "m": message_id, "t": round(t, 3)}
+                    row = self.rows.get(recipient)
+                    if row and row[1] == t:
+                        entry["s"] = row[0]
+                    cursor = self.cursors.get(recipient)
+                    if cursor and cursor[1] == t and cursor[0] != message_id:
+                        entry["c"] = cursor[0]
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            self.log_lines = len(self.messages)
+            log_activity(f"🗂️ Compacted processed index to {self.log_lines} entries.")
+        except OSError as e:
+            log_error(f"⚠️ Could not compact processed index: {str(e)}")
+
+PROCESSED_INDEX = ProcessedIndex(PROCESSED_INDEX_FILE)
+
+# ------------------ CONVERSATION PROCESSING ------------------
+
+def xpath_literal(value):
+    """Quote a string for use inside an XPath expression"""
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    parts = value.split("'")
+    return "concat(" + ", \"'\", ".join(f"'{part}'" for part in parts) + ")"
+
+def find_unread_badge(driver, recipient):
+    """Re-locate the unread badge of a conversation by its recipient name"""
+    xpath = f"//div[@data-name={xpath_literal(recipient)}]//*[contains(@class, 'unread-num')]"
+    badges = safe_find_elements(driver, By.XPATH, xpath)
+    return badges[0] if badges else None
+
+INQUIRY_PREVIEW_CLASSES = [
+    'latest-msg-oneline',
+    'latest-msg',
+    'msg-content',
+    'message-content',
+    'session-content'
+]
+INQUIRY_KEYWORDS = ["[Inquiry]", "[Product]", "inquiry", "product"]
+
+# Collects every conversation row in one round trip instead of a find_element per field.
+INBOX_SNAPSHOT_JS = """
+var previewClasses = arguments[0];
+var text = function (el) { return el ? (el.textContent || '').trim() : ''; };
+var rows = [];
+document.querySelectorAll('div[data-name]').forEach(function (row, index) {
+    var badge = row.querySelector('.unread-num');
+    var preview = '';
+    for (var i = 0; i < previewClasses.length; i++) {
+        var el = row.querySelector('.' + previewClasses[i]);
+        if (el) { preview = text(el); break; }
+    }
+    var name = row.getAttribute('data-name') || '';
+    var idHolder = row.querySelector('[data-msg-id]');
+    rows.push({
+        id: row.getAttribute('data-id') || row.getAttribute('data-conversation-id') || row.id || name || String(index),
+        name: name,
+        unread: badge ? (parseInt(text(badge), 10) || 1) : 0,
+        preview: preview,
+        labels: Array.prototype.map.call(row.querySelectorAll('.tag-item'), text),
+        time: text(row.querySelector('.contact-time')),
+        last_msg_id: row.getAttribute('data-msg-id') || (idHolder ? idHolder.getAttribute('data-msg-id') : '')
+    });
+});
+return rows;
+"""
+
+def get_inbox_snapshot(driver):
+    """Return a plain-data snapshot of all conversation rows in a single WebDriver call"""
+    try:
+        rows = driver.execute_script(INBOX_SNAPSHOT_JS, INQUIRY_PREVIEW_CLASSES)
+        return rows or []
+    except InvalidSessionIdException:
+        raise
+    except WebDriverException as e:
+        log_activity(f"⚠️ Could not read inbox snapshot: {str(e)}")
+        return []
+
+def is_inquiry_text(message_text):
+    """Check if a conversation preview looks like an inquiry"""
+    return any(keyword.lower() in message_text.lower() for keyword in INQUIRY_KEYWORDS)
+
+def is_eligible_row(row):
+    """Decide from snapshot data whether an unread conversation should be answered"""
+    if not row.get("unread"):
+        return False
+    return not PROCESSED_INDEX.row_handled(row.get("name") or "Unknown Recipient", row)
+
+def find_eligible_conversations(driver):
+    """Return (recipient, is_inquiry, row) for every unread conversation that should be answered"""
+    eligible = []
+    seen = set()
+    for row in get_inbox_snapshot(driver):
+        recipient = row.get("name") or "Unknown Recipient"
+        if recipient in seen or not is_eligible_row(row):
+            continue
+        seen.add(recipient)
+        eligible.append((recipient, is_inquiry_text(row.get("preview", "")), row))
+    return eligible
+
+def process_conversation(driver, recipient, is_inquiry, row=None, already_open=False):
+    """Open one conversation, reply to it and return to the inbox. Returns True if a reply was sent."""
+    return run_steps(conversation_steps(driver, recipient, is_inquiry, row, already_open))
+
+def conversation_steps(driver, recipient, is_inquiry, row=None, already_open=False):
+    """process_conversation() as a step generator, for the tab scheduler"""
+    sent = False
+    start = time.time()
+    trace = {"t": round(start, 3), "recipient": recipient, "inquiry": is_inquiry, "row": row} if TRACE_RECORDING else None
+    try:
+        if not already_open:
+            with timed_stage("open_conversation"):
+                opened = open_conversation(driver, recipient)
+            if not opened:
+                log_activity(f"⚠️ Conversation with {recipient} is no longer unread, skipping.")
+                return False
+            OPEN_THREADS[driver.current_window_handle] = (recipient, is_inquiry)
+
+            log_activity(f"📨 New unread message from: {recipient}")
+            yield human_delay("after_open")
+
+        # Read only the messages that arrived since the last reply in this conversation
+        message_id = None
+        with timed_stage("extract_message_data"):
+            messages = extract_new_messages(driver, recipient, trace)
+        if messages is None:
+            message_text, img_url = "New message", None
+            log_activity("⚠️ Could not extract message details, using default.")
+        elif not messages:
+            log_activity(f"⏭️ Nothing new from {recipient} since the last reply, skipping.")
+            PROCESSED_INDEX.mark(recipient, PROCESSED_INDEX.cursor(recipient) or "row:" + row_signature(row or {}), row)
+            ensure_inbox(driver)
+            return False
+        else:
+            message_id = messages[-1]["id"]
+            message_text, img_url = thread_query(messages)
+            if len(messages) > 1:
+                log_activity(f"🧵 {len(messages)} new messages from {recipient}")
+
+        # The reply is generated on the IO pool while this thread reads the buyer profile
+        reply_started = time.time()
+        reply_future = start_reply(message_text, img_url)
+        profile = None
+        if is_inquiry:
+            with timed_stage("extract_profile"):
+                profile = extract_profile(driver)
+        with timed_stage("generate_reply"):
+            reply = yield reply_future
+        if trace is not None:
+            trace["rag"] = {"query": message_text, "image": img_url, "reply": reply, "seconds": round(time.time() - reply_started, 3)}
+        with timed_stage("send_message"):
+            sent = yield from send_message_steps(driver, recipient, reply)
+        if sent:
+            # Read forward from our reply next time. If it has no id yet, drop the cursor:
+            # one left on the buyer's message would return our reply as a new message.
+            reply_id = sent_message_id(driver, reply)
+            PROCESSED_INDEX.mark(recipient, message_id or "row:" + row_signature(row or {}), row, reply_id or "")
+        if sent and is_inquiry:
+            log_activity("🔄 Inquiry detected, storing data.")
+            with timed_stage("store_inquiry"):
+                store_inquiry(driver, img_url, profile, trace)
+
+    except (NoSuchElementException, StaleElementReferenceException) as e:
+        log_activity(f"⚠️ Element became stale, checking page state: {str(e)}")
+
+    with timed_stage("return_to_inbox"):
+        ensure_inbox(driver, after_conversation=True)
+
+    inc_counter("alibaba_messages_processed_total")
+    inc_counter("alibaba_replies_sent_total" if sent else "alibaba_replies_failed_total")
+    observe("alibaba_message_seconds", time.time() - start)
+    if trace is not None:
+        trace.update({"sent": sent, "seconds": round(time.time() - start, 3)})
+        record_trace(trace)
+    return sent
+
+def open_thread_followups(driver):
+    """Answer buyers who wrote again into a conversation we left open in some tab.
+
+    The PWA marks messages in the shown thread read at once, so such follow-ups
+    never get an unread badge. Each open thread is read forward from its cursor
+    instead; without one a follow-up cannot be told from our own reply, so the
+    thread is left alone. Returns (conversations attempted, conversations answered).
+    """
+    attempted = answered = 0
+    if not OPEN_THREADS:
+        return attempted, answered
+    home = driver.current_window_handle
+    try:
+        for handle, (recipient, is_inquiry) in list(OPEN_THREADS.items()):
+            if thread_cursor(recipient) is None and not OWN_MESSAGE_EXPINFO:
+                continue
+            try:
+                if handle != driver.current_window_handle:
+                    driver.switch_to.window(handle)
+                if detect_page_state(driver) not in (PAGE_CONVERSATION, PAGE_PROFILE_PANEL):
+                    del OPEN_THREADS[handle]
+                    continue
+                if not extract_new_messages(driver, recipient):
+                    continue
+            except InvalidSessionIdException:
+                raise
+            except WebDriverException:
+                OPEN_THREADS.pop(handle, None)  # Tab closed, or a browser that was replaced
+                continue
+            log_activity(f"📨 Follow-up from {recipient} in the open conversation")
+            attempted += 1
+            if process_conversation(driver, recipient, is_inquiry, already_open=True):
+                answered += 1
+    finally:
+        try:
+            driver.switch_to.window(home)
+        except InvalidSessionIdException:
+            raise
+        except WebDriverException:
+            pass
+    return attempted, answered
+
+def drain_conversations(driver):
+    """Answer follow-ups in open threads, then every eligible unread conversation, up to MAX_CONVERSATIONS_PER_CYCLE.
+
+    Elements are re-located by recipient before each conversation, since the
+    SPA re-renders the list and invalidates the references from the first scan.
+    Returns the number of conversations answered in this cycle; skipped ones
+    and failed sends are attempted but not answered.
+    """
+    global TOTAL_CONVERSATIONS_ANSWERED, THROUGHPUT_STARTED_AT
+
+    cycle_start = time.time()
+    attempted, answered = open_thread_followups(driver)
+    with timed_stage("detect"):
+        eligible = find_eligible_conversations(driver)
+    set_gauge("alibaba_eligible_conversations", len(eligible))
+    if not eligible and not attempted:
+        return 0
+
+    if THROUGHPUT_STARTED_AT is None:
+        THROUGHPUT_STARTED_AT = cycle_start
+
+    batch = eligible[:MAX_CONVERSATIONS_PER_CYCLE]
+    if len(eligible) > len(batch):
+        log_activity(f"📥 {len(eligible)} eligible conversations, draining the first {len(batch)} this cycle.")
+    prefetch_replies([row for _, _, row in batch])
+
+    if batch and TAB_POOL_SIZE > 1:
+        batch_attempted, batch_answered = TAB_SCHEDULER.run(driver, batch)
+        attempted += batch_attempted
+        answered += batch_answered
+    else:
+        for recipient, is_inquiry, row in batch:
+            attempted += 1
+            if process_conversation(driver, recipient, is_inquiry, row):
+                answered += 1
+
+    elapsed = time.time() - cycle_start
+    TOTAL_CONVERSATIONS_ANSWERED += answered
+    if WORKER_STATS_QUEUE is not None:
+        WORKER_STATS_QUEUE.put({"worker": WORKER_NAME, "attempted": attempted, "answered": answered, "elapsed": elapsed, "at": time.time()})
+    total_elapsed = max(time.time() - THROUGHPUT_STARTED_AT, 1e-6)
+    log_activity(
+        f"📊 Cycle answered {answered}/{attempted} attempted ({len(eligible)} eligible) conversations in {elapsed:.1f}s "
+        f"({answered / max(elapsed, 1e-6) * 60:.1f}/min, "
+        f"{TOTAL_CONVERSATIONS_ANSWERED / total_elapsed * 60:.1f}/min overall)"
+    )
+    log_activity(f"🧭 Navigation: {navigation_summary()}")
+    return answered
+
+TRACE_LOCK = threading.Lock()
+
+def record_trace(trace):
+    """Append one processed message (inbox row, raw thread, RAG call, webhook payload) to TRACE_FILE"""
+    try:
+        line = json.dumps(trace, ensure_ascii=False, separators=(",", ":"))
+        with TRACE_LOCK, open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except (OSError, TypeError, ValueError) as e:
+        log_error(f"⚠️ Could not record trace: {str(e)}")
+
+# ------------------ TAB SCHEDULER ------------------
+
+class ConversationTab:
+    """One browser tab with the PWA loaded, and the conversation it is working on"""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.steps = None
+        self.recipient = None
+        self.wait = 0.0  # Absolute time the tab may continue at, or a Future it waits on
+        self.errors = 0
+
+    def start(self, steps, recipient):
+        self.steps = steps
+        self.recipient = recipient
+        self.wait = time.time()
+
+    def finish(self):
+        self.steps = None
+        self.recipient = None
+
+    def ready(self):
+        if isinstance(self.wait, Future):
+            return self.wait.done()
+        return time.time() >= self.wait
+
+class TabScheduler:
+    """Interleaves conversations across a pool of tabs in one Chrome session.
+
+    All tabs are driven from the calling thread. While one tab sits in a
+    human-pacing pause or waits on RAG, the driver switches to another tab
+    that can make progress, so every buyer still sees realistic pacing. The
+    main tab (the one push detection watches) is the first tab of the pool,
+    and the driver is always back on it when run() returns.
+    """
+
+    def __init__(self):
+        self.driver = None
+        self.main_handle = None
+        self.tabs = []
+
+    def attach(self, driver):
+        if driver is not self.driver:
+            self.driver = driver
+            self.main_handle = driver.current_window_handle
+            self.tabs = [ConversationTab(self.main_handle)]
+
+    def capacity(self):
+        """Tabs allowed right now: TAB_POOL_SIZE, fewer if memory cannot afford them"""
+        spare_mb = psutil.virtual_memory().available / (1024 * 1024) - TAB_MIN_FREE_MEMORY_MB
+        rss_mb = WATCHDOG.last.get("rss_mb")
+        if rss_mb is not None and WATCHDOG_MAX_RSS_MB:
+            spare_mb = min(spare_mb, WATCHDOG_MAX_RSS_MB * 0.8 - rss_mb)
+        affordable = len(self.tabs) + int(spare_mb // TAB_MEMORY_ESTIMATE_MB)
+        return max(1, min(TAB_POOL_SIZE, affordable))
+
+    def open_tab(self):
+        self.driver.switch_to.new_window("tab")
+        tab = ConversationTab(self.driver.current_window_handle)
+        self.tabs.append(tab)
+        try:
+            apply_resource_blocking(self.driver)
+            self.driver.get(MAIN_URL)
+            wait_for_conversation_list(self.driver, timeout=30)
+        except WebDriverException:
+            self.close_tab(tab)
+            raise
+        log_activity(f"🗂️ Opened conversation tab {len(self.tabs)}")
+
+    def close_tab(self, tab):
+        self.tabs.remove(tab)
+        try:
+            self.driver.switch_to.window(tab.handle)
+            self.driver.close()
+        except WebDriverException:
+            pass
+        self.driver.switch_to.window(self.main_handle)
+
+    def resize(self):
+        target = self.capacity()
+        while len(self.tabs) < target:
+            try:
+                self.open_tab()
+            except WebDriverException as e:
+                log_activity(f"⚠️ Could not open another conversation tab: {str(e)}")
+                break
+        for tab in [tab for tab in self.tabs[target:] if tab.steps is None]:
+            self.close_tab(tab)
+        set_gauge("alibaba_conversation_tabs", len(self.tabs))
+
+    def reset_tab(self, tab):
+        """Bring a tab that failed back to a usable inbox, or replace it after repeated failures"""
+        if tab.handle != self.main_handle and tab.errors >= TAB_MAX_ERRORS:
+            log_activity(f"🗂️ Closing conversation tab after {tab.errors} consecutive errors")
+            self.close_tab(tab)
+            return
+        try:
+            self.driver.switch_to.window(tab.handle)
+            hard_reload(self.driver, "tab error")
+        except InvalidSessionIdException:
+            raise
+        except WebDriverException as e:
+            log_error(f"⚠️ Could not reset conversation tab: {str(e)}")
+            if tab.handle != self.main_handle:
+                self.close_tab(tab)
+
+    def step(self, tab):
+        """Run one tab until its next wait.
+
+        Returns None while its conversation is still going, then whether a reply was sent.
+        """
+        self.driver.switch_to.window(tab.handle)
+        try:
+            wait = resume(tab.steps, tab.wait)
+        except StopIteration as stop:
+            tab.finish()
+            tab.errors = 0
+            return bool(stop.value)
+        except InvalidSessionIdException:
+            raise
+        except Exception as e:
+            # One broken tab must not take the others down, unless the whole browser is gone
+            if not is_session_valid(self.driver, force=True):
+                raise InvalidSessionIdException(f"Session lost in conversation tab: {str(e)}")
+            tab.errors += 1
+            inc_counter("alibaba_tab_errors_total")
+            log_error(f"⚠️ Conversation tab failed on {tab.recipient}: {str(e)}")
+            tab.finish()
+            self.reset_tab(tab)
+            return False
+        tab.wait = wait if isinstance(wait, Future) else time.time() + (wait or 0)
+        return None
+
+    def run(self, driver, batch):
+        """Work through batch across the tab pool; returns (conversations finished, conversations answered)"""
+        self.attach(driver)
+        self.resize()
+        pending = deque(batch)
+        finished = answered = 0
+        try:
+            while pending or any(tab.steps for tab in self.tabs):
+                for tab in self.tabs:
+                    if tab.steps is None and pending:
+                        recipient, is_inquiry, row = pending.popleft()
+                        tab.start(conversation_steps(driver, recipient, is_inquiry, row), recipient)
+
+                ready = [tab for tab in self.tabs if tab.steps and tab.ready()]
+                if not ready:
+                    pauses = [tab.wait for tab in self.tabs if tab.steps and not isinstance(tab.wait, Future)]
+                    time.sleep(min([TAB_IDLE_SLICE] + [max(at - time.time(), 0) for at in pauses]))
+                    continue
+                # Earliest deadline first, so no buyer's pause runs much past its budget
+                tab = min(ready, key=lambda tab: 0 if isinstance(tab.wait, Future) else tab.wait)
+                sent = self.step(tab)
+                if sent is not None:
+                    finished += 1
+                    answered += sent
+        finally:
+            try:
+                driver.switch_to.window(self.main_handle)
+            except WebDriverException:
+                pass
+        return finished, answered
+
+TAB_SCHEDULER = TabScheduler()
+
 # ------------------ MAIN LOOP ------------------
 
 def main():
+    open_inquiry_ledger()
+    open_webhook_outbox().start()
+    start_metrics()
+    WATCHDOG.start()
+
     driver = start_browser()
     if not driver:
         print("❌ Failed to start browser.")
@@ -474,26 +3122,12 @@ def main():
         log_error("❌ Failed to login")
         cleanup_and_exit()
 
-    # Close popups with error handling
-    try:
-        close_pop = safe_find_elements(driver, By.CLASS_NAME, "im-next-dialog-close")
-        if close_pop:
-            close_pop[0].click()
-            log_activity("🔒 Closed pop-up.")
-    except Exception as e:
-        log_activity(f"⚠️ Could not close first popup: {str(e)}")
+    close_dialogs(driver)
 
-    try:
-        close_pop = safe_find_elements(driver, By.CLASS_NAME, "close-icon")
-        if close_pop:
-            close_pop[0].click()
-            log_activity("🔒 Closed pop-up.")
-    except Exception as e:
-        log_activity(f"⚠️ Could not close second popup: {str(e)}")
-
-    i = 0
     consecutive_errors = 0
     last_session_check = time.time()
+    last_activity = time.time()
+    poll_interval = POLL_INTERVAL_MIN
     session_recovery_attempts = 0
     
     while True:
@@ -501,98 +3135,42 @@ def main():
             # Periodic session health check
             current_time = time.time()
             if current_time - last_session_check > SESSION_CHECK_INTERVAL:
-                if not is_session_valid(driver):
+                if not is_session_valid(driver, force=True):
                     log_activity("⚠️ Session health check failed")
                     raise InvalidSessionIdException("Session invalid during health check")
                 last_session_check = current_time
                 log_activity("✅ Session health check passed")
 
-            unread_messages = safe_find_elements(driver, By.CLASS_NAME, "unread-num")
-            unread_messages_without_labels = []
-
-            for message in unread_messages:
-                try:
-                    is_inquiry = False
-                    container = message.find_element(By.XPATH, "ancestor::div[2]")
-                    
-                    # Check if it's an inquiry with error handling
-                    is_inquiry = check_if_inquiry(container)
-                    
-                    labels = safe_find_elements(container, By.CLASS_NAME, "tag-item")
-                    
-                    # Get message time with error handling
-                    try:
-                        last_msg_time = safe_find_element(container, By.CLASS_NAME, "contact-time")
-                        if last_msg_time:
-                            today = datetime.today()
-                            msg_dt = datetime.strptime(last_msg_time, "%H:%M").replace(year=today.year, month=today.month, day=today.day)
-                            msg_timestamp = msg_dt.timestamp()
-                            
-                            # Only process if no labels or message is recent
-                            if not labels or time.time() - 180 > msg_timestamp:
-                                unread_messages_without_labels.append((message, is_inquiry))
-                        else:
-                            # If we can't get time, still process the message
-                            if not labels:
-                                unread_messages_without_labels.append((message, is_inquiry))
-                    except (ValueError, AttributeError) as e:
-                        log_activity(f"⚠️ Could not parse message time: {str(e)}")
-                        # If we can't parse time, still process if no labels
-                        if not labels:
-                            unread_messages_without_labels.append((message, is_inquiry))
-                            
-                except (NoSuchElementException, StaleElementReferenceException) as e:
-                    log_activity(f"⚠️ Stale element encountered, skipping message: {str(e)}")
-                    continue
-
-            if unread_messages_without_labels:
-                i = 0
+            busy = drain_conversations(driver) > 0
+            if busy:
+                last_activity = time.time()
                 consecutive_errors = 0  # Reset error counter on success
                 session_recovery_attempts = 0  # Reset recovery attempts
-                
-                message_element, is_inquiry = unread_messages_without_labels[0]
-                try:
-                    container = message_element.find_element(By.XPATH, "ancestor::div[2]")
-                    recipient = container.get_attribute("data-name") or "Unknown Recipient"
-                    log_activity(f"📨 New unread message from: {recipient}")
-                    
-                    message_element.click()
-                    time.sleep(random.uniform(2, 5))
-
-                    # Try to extract message data
-                    try:
-                        message_container = driver.find_element(By.CSS_SELECTOR, "div.scroll-box > *")
-                        message_text, img_url = extract_message_data(message_container)
-                    except NoSuchElementException:
-                        message_text, img_url = "New message", None
-                        log_activity("⚠️ Could not extract message details, using default.")
-
-                    reply = generate_reply(driver, message_text, img_url)
-                    if send_message(driver, recipient, reply):
-                        if is_inquiry:
-                            log_activity("🔄 Inquiry detected, storing data.")
-                            store_inquiry(driver, img_url)
-
-                    driver.get(MAIN_URL)
-                    log_activity("🔄 Returned to main page.")
-                    
-                except (NoSuchElementException, StaleElementReferenceException) as e:
-                    log_activity(f"⚠️ Element became stale, refreshing page: {str(e)}")
-                    driver.get(MAIN_URL)
-                    time.sleep(5)
-
-            time.sleep(random.uniform(10, 15))
-            i += 1
-            
-            # Refresh page periodically
-            if i > 7:
-                log_activity("🔄 Refreshing main page after inactivity.")
-                if is_session_valid(driver):
-                    driver.refresh()
-                    time.sleep(random.uniform(25, 30))
+
+            poll_interval = next_poll_interval(poll_interval, busy)
+            events = wait_for_new_messages(driver, poll_interval)
+            if events:
+                log_activity(f"📡 {len(events)} new-message event(s) via {', '.join(sorted({e.get('source', '?') for e in events}))}")
+                poll_interval = POLL_INTERVAL_MIN
+                continue
+
+            # Nothing in flight and nothing arrived: a safe moment to replace a degrading browser
+            if WATCHDOG.recycle_reason and not busy:
+                driver = recycle_browser(driver)
+                last_activity = time.time()
+                continue
+
+            refresh_saved_cookies(driver)
+
+            # Check the page state after inactivity, reloading only when it is invalid or overdue
+            if time.time() - last_activity > IDLE_REFRESH_INTERVAL:
+                if not is_session_valid(driver):
+                    raise InvalidSessionIdException("Session invalid during idle check")
+                if time.time() - LAST_HARD_RELOAD > HARD_REFRESH_INTERVAL:
+                    hard_reload(driver, "periodic refresh")
                 else:
-                    raise InvalidSessionIdException("Session invalid during refresh")
-                i = 0
+                    ensure_inbox(driver)
+                last_activity = time.time()
                 
         except InvalidSessionIdException as e:
             log_error(f"⚠️ Session disconnected: {str(e)}")
@@ -618,8 +3196,7 @@ def main():
                 log_activity("🔄 Too many consecutive errors, attempting recovery...")
                 try:
                     if is_session_valid(driver):
-                        driver.get(MAIN_URL)
-                        time.sleep(10)
+                        hard_reload(driver, "too many consecutive errors")
                         consecutive_errors = 0
                     else:
                         # Session is invalid, attempt recovery
@@ -634,8 +3211,188 @@ def main():
                     log_error(f"❌ Recovery failed: {str(recovery_error)}")
                     cleanup_and_exit()
             else:
-                # Wait a bit before retrying
-                time.sleep(random.uniform(30, 60))
+                # Back off before retrying, longer with every consecutive error
+                error_backoff(consecutive_errors)
 
-if __name__ == "__main__":
+# ------------------ MULTI-ACCOUNT SUPERVISOR ------------------
+
+class SharedServices(BaseManager):
+    """Serves one RAG client, reply cache, webhook outbox and inquiry ledger to every worker process"""
+
+def get_shared_rag_client():
+    return RAG_CLIENT
+
+def get_shared_reply_cache():
+    return REPLY_CACHE
+
+def get_shared_webhook_outbox():
+    return open_webhook_outbox()
+
+def get_shared_inquiry_ledger():
+    return open_inquiry_ledger()
+
+SharedServices.register("rag_client", callable=get_shared_rag_client)
+SharedServices.register("reply_cache", callable=get_shared_reply_cache)
+SharedServices.register("webhook_outbox", callable=get_shared_webhook_outbox)
+SharedServices.register("inquiry_ledger", callable=get_shared_inquiry_ledger)
+
+def load_accounts(path):
+    """Read the accounts file: a JSON list of {"name", optional "cookies", "profile_dir", "log_dir", "metrics_port"}"""
+    with open(path, "r", encoding="utf-8") as f:
+        accounts = json.load(f)
+    for account in accounts:
+        worker_dir = os.path.join(WORKERS_DIR, account["name"])
+        account.setdefault("cookies", os.path.join(worker_dir, "cookies.json"))
+        account.setdefault("profile_dir", os.path.join(worker_dir, "chrome-profile"))
+        account.setdefault("log_dir", worker_dir)
+    return accounts
+
+def run_worker(account, services_address, authkey, stats_queue):
+    """Process entry point: run main() for one seller account against the shared services"""
+    global COOKIES_FILE, ERROR_LOG, ACTIVITY_LOG, CHROME_PROFILE_DIR, WORKER_NAME, WORKER_STATS_QUEUE
+    global METRICS_PORT, METRICS_DUMP_FILE, PROCESSED_INDEX, TRACE_FILE
+    global RAG_CLIENT, REPLY_CACHE, WEBHOOK_OUTBOX, INQUIRY_LEDGER
+
+    os.makedirs(account["log_dir"], exist_ok=True)
+    os.makedirs(account["profile_dir"], exist_ok=True)
+    COOKIES_FILE = account["cookies"]
+    ERROR_LOG = os.path.join(account["log_dir"], "error.log")
+    ACTIVITY_LOG = os.path.join(account["log_dir"], "activity.log")
+    CHROME_PROFILE_DIR = account["profile_dir"]
+    METRICS_PORT = account.get("metrics_port")
+    METRICS_DUMP_FILE = os.path.join(account["log_dir"], "metrics.jsonl")
+    TRACE_FILE = os.path.join(account["log_dir"], "traces.jsonl")
+    WORKER_NAME = account["name"]
+    WORKER_STATS_QUEUE = stats_queue
+    setup_logging()
+    PROCESSED_INDEX = ProcessedIndex(os.path.join(account["log_dir"], "processed_index.jsonl"))
+
+    # The supervisor stops workers with SIGTERM; take our Chrome down with us
+    signal.signal(signal.SIGTERM, lambda signum, frame: cleanup_and_exit())
+
+    services = SharedServices(address=services_address, authkey=authkey)
+    services.connect()
+    RAG_CLIENT = services.rag_client()
+    REPLY_CACHE = services.reply_cache()
+    WEBHOOK_OUTBOX = services.webhook_outbox()
+    INQUIRY_LEDGER = services.inquiry_ledger()
+
+    log_activity(f"👷 Worker {WORKER_NAME} started (PID: {os.getpid()})")
     main()
+
+def start_worker(account, services, stats_queue):
+    process = multiprocessing.Process(
+        target=run_worker,
+        args=(account, services.address, bytes(multiprocessing.current_process().authkey), stats_queue),
+        name=f"worker-{account['name']}"
+    )
+    process.start()
+    return process
+
+def run_supervisor(accounts_path):
+    """Run one isolated browser worker per account, restart crashed ones and report throughput"""
+    accounts = []
+    for account in load_accounts(accounts_path):
+        if os.path.exists(account["cookies"]):
+            accounts.append(account)
+        else:
+            log_error(f"❌ No cookies for account {account['name']} at {account['cookies']}, skipping it.")
+    if not accounts:
+        log_error("❌ No runnable accounts, nothing to supervise.")
+        return
+
+    # Patch chromedriver once here; workers starting together would otherwise race to re-patch the same file
+    try:
+        uc.Patcher().auto()
+    except Exception as e:
+        log_error(f"❌ Could not prepare chromedriver for the workers: {str(e)}")
+        return
+
+    services = SharedServices(address=("127.0.0.1", 0))
+    services.start()
+    services.webhook_outbox().start()
+    stats_queue = multiprocessing.Queue()
+
+    workers = {}
+    for account in accounts:
+        workers[account["name"]] = {
+            "account": account,
+            "process": start_worker(account, services, stats_queue),
+            "started_at": time.time(),
+            "restart_at": None,
+            "backoff": WORKER_RESTART_BACKOFF,
+            "restarts": 0,
+            "attempted": 0,
+            "answered": 0,
+            "busy_seconds": 0.0
+        }
+    log_activity(f"🧭 Supervisor started {len(workers)} workers: {', '.join(workers)}")
+
+    started_at = time.time()
+    last_report = time.time()
+    try:
+        while True:
+            try:
+                stats = stats_queue.get(timeout=5)
+                worker = workers.get(stats["worker"])
+                if worker:
+                    worker["attempted"] += stats["attempted"]
+                    worker["answered"] += stats["answered"]
+                    worker["busy_seconds"] += stats["elapsed"]
+            except queue.Empty:
+                pass
+
+            now = time.time()
+            for name, worker in workers.items():
+                process = worker["process"]
+                if process.is_alive():
+                    continue
+                if worker["restart_at"] is None:
+                    if now - worker["started_at"] > WORKER_STABLE_AFTER:
+                        worker["backoff"] = WORKER_RESTART_BACKOFF
+                    worker["restart_at"] = now + worker["backoff"]
+                    log_error(f"⚠️ Worker {name} exited with code {process.exitcode}, restarting in {worker['backoff']:.0f}s")
+                    worker["backoff"] = min(worker["backoff"] * 2, WORKER_MAX_RESTART_BACKOFF)
+                elif now >= worker["restart_at"]:
+                    worker["process"] = start_worker(worker["account"], services, stats_queue)
+                    worker["started_at"] = now
+                    worker["restart_at"] = None
+                    worker["restarts"] += 1
+
+            if now - last_report > SUPERVISOR_REPORT_INTERVAL:
+                minutes = (now - started_at) / 60
+                for name, worker in workers.items():
+                    log_activity(
+                        f"📊 Worker {name}: {worker['answered']}/{worker['attempted']} conversations answered "
+                        f"({worker['answered'] / minutes:.1f}/min), busy {worker['busy_seconds']:.0f}s, "
+                        f"{worker['restarts']} restarts, {'up' if worker['process'].is_alive() else 'down'}"
+                    )
+                rag = services.rag_client().stats()
+                log_activity(f"📊 Shared RAG: {rag['requests']} requests, {rag['error_rate']:.0%} errors; "
+                             f"outbox pending: {services.webhook_outbox().pending_count()}")
+                last_report = now
+    except KeyboardInterrupt:
+        log_activity("🛑 Supervisor stopping workers...")
+    finally:
+        for worker in workers.values():
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+        for worker in workers.values():
+            worker["process"].join(timeout=10)
+        services.reply_cache().save()
+        services.shutdown()
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="Alibaba OneTalk auto-responder")
+    parser.add_argument("--accounts", help="JSON list of seller accounts to run as parallel workers")
+    parser.add_argument("--export", metavar="PATH", help="export stored inquiries to a .xlsx or .csv file and exit")
+    parser.add_argument("--full", action="store_true", help="with --export, export all inquiries instead of only new ones")
+    args = parser.parse_args()
+
+    if args.export:
+        export_inquiries(args.export, full=args.full)
+    elif args.accounts:
+        run_supervisor(args.accounts)
+    else:
+        main()
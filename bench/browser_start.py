@@ -0,0 +1,85 @@
+"""Measure Chrome startup and session-recovery time: cold vs. warm profile vs. standby swap.
+
+Cold launches use a fresh, empty user-data-dir every time. Warm launches reuse
+one persistent profile that was populated by a first visit to the fixture
+page. The standby case times app.recover_session() with WARM_STANDBY on,
+i.e. how long a crashed session is out of action when a prelaunched browser
+is swapped in.
+
+    python bench/browser_start.py --runs 5
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from stubs import start_fixture_server
+
+
+def timed_launch(profile_dir, page_url):
+    """Seconds until a new browser has rendered the fixture page"""
+    started = time.time()
+    driver = app.launch_chrome(profile_dir)
+    try:
+        driver.get(page_url)
+        app.wait_for_page_load(driver)
+        return time.time() - started
+    finally:
+        app.retire_browser(driver, driver.browser_pid)
+
+
+def summary(values):
+    values = sorted(values)
+    return f"p50 {values[len(values) // 2]:.2f}s, min {values[0]:.2f}s, max {values[-1]:.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="launches per scenario")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="alibaba-browser-start-")
+    fixtures = start_fixture_server()
+    page_url = f"{fixtures.url}/onetalk.html?rate=0"
+    app.DETECTION_MODE = "poll"
+    app.METRICS_PORT = None
+
+    try:
+        cold = []
+        for run in range(args.runs):
+            cold.append(timed_launch(os.path.join(work_dir, f"cold-{run}"), page_url))
+
+        warm_profile = os.path.join(work_dir, "warm")
+        timed_launch(warm_profile, page_url)  # Populate the profile once
+        warm = [timed_launch(warm_profile, page_url) for _ in range(args.runs)]
+
+        app.CHROME_PROFILE_DIR = os.path.join(work_dir, "standby")
+        app.WARM_STANDBY = True
+        driver = app.start_browser()
+        swaps = []
+        for _ in range(args.runs):
+            # Wait for the background launch of the next standby
+            while app.STANDBY_BROWSER.driver is None:
+                time.sleep(0.2)
+            started = time.time()
+            driver = app.recover_session(driver)
+            driver.get(page_url)
+            app.wait_for_page_load(driver)
+            swaps.append(time.time() - started)
+        app.STANDBY_BROWSER.close()
+        app.retire_browser(driver, app.CHROME_PID)
+
+        print(f"🥶 Cold profile launch: {summary(cold)}")
+        print(f"🔥 Warm profile launch: {summary(warm)}")
+        print(f"🔁 Standby swap on recovery: {summary(swaps)}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
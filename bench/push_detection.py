@@ -0,0 +1,118 @@
+"""Exercise push-based new-message detection against a local fake OneTalk page.
+
+Serves bench/fixtures/push_frames.html over HTTP, pushes fake IM frames to it
+from a minimal local WebSocket server and reports how quickly
+app.wait_for_new_messages() picks each one up, per event source.
+
+    python bench/push_detection.py --rate 30 --duration 60
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from stubs import start_fixture_server
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC11B85"
+
+
+def websocket_frame(payload):
+    data = payload.encode("utf-8")
+    if len(data) < 126:
+        header = bytes([0x81, len(data)])
+    else:
+        header = bytes([0x81, 126]) + struct.pack(">H", len(data))
+    return header + data
+
+
+def push_frames(conn, interval, sent_times):
+    """Complete the WebSocket handshake, then send one fake new-message frame per interval"""
+    request = conn.recv(4096).decode("latin-1")
+    key = re.search(r"Sec-WebSocket-Key:\s*(\S+)", request, re.IGNORECASE).group(1)
+    accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+    conn.sendall((
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+    ).encode())
+
+    seq = 0
+    try:
+        while True:
+            time.sleep(interval)
+            seq += 1
+            frame = json.dumps({"type": "newMessage", "messageType": 1, "msgId": seq, "buyer": f"Buyer {seq}"})
+            sent_times.append(time.time())
+            conn.sendall(websocket_frame(frame))
+    except OSError:
+        pass
+
+
+def serve_websocket(interval, sent_times):
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def accept_loop():
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=push_frames, args=(conn, interval, sent_times), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return server
+
+
+def latency_after(event_at, sent_times):
+    """Time between an event and the most recent frame sent before it"""
+    earlier = [sent for sent in sent_times if sent <= event_at]
+    return event_at - earlier[-1] if earlier else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=30, help="fake messages per minute")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to listen")
+    args = parser.parse_args()
+
+    sent_times = []
+    http_server = start_fixture_server()
+    ws_server = serve_websocket(60 / args.rate, sent_times)
+    ws_url = f"ws://127.0.0.1:{ws_server.getsockname()[1]}"
+    page_url = f"{http_server.url}/push_frames.html?ws={ws_url}"
+
+    app.DETECTION_MODE = "push"
+    driver = app.start_browser()
+    try:
+        driver.get(page_url)
+        latencies = {}
+        deadline = time.time() + args.duration
+        while time.time() < deadline:
+            for event in app.wait_for_new_messages(driver, app.POLL_INTERVAL_MAX):
+                latency = latency_after(event["at"], sent_times)
+                if latency is not None:
+                    latencies.setdefault(event["source"], []).append(latency)
+
+        print(f"📨 Frames sent: {len(sent_times)}")
+        for source, values in sorted(latencies.items()):
+            values.sort()
+            print(
+                f"📡 {source}: {len(values)} events, "
+                f"p50 {values[len(values) // 2] * 1000:.0f} ms, "
+                f"max {values[-1] * 1000:.0f} ms"
+            )
+    finally:
+        driver.quit()
+        app.cleanup_our_chrome_process()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Drive app.RagClient against the local RAG stub through healthy, flaky and down phases.
+
+Afterwards, compares answering a queue of conversations one request at a time
+with search_batch() against a stub with and without a batch endpoint.
+
+    python bench/rag_client.py --requests 50 --latency 0.05 --failure-rate 0.2
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from stubs import start_rag_stub
+
+
+def run_phase(client, name, count):
+    start = time.time()
+    answered = sum(1 for _ in range(count) if client.search(f"{name} question") is not None)
+    elapsed = time.time() - start
+    print(f"▶️ {name}: {answered}/{count} answered in {elapsed:.2f}s ({elapsed / count * 1000:.0f} ms/request)")
+
+
+def run_batch_phase(name, batch, count, latency):
+    stub = start_rag_stub(latency=latency, batch=batch)
+    client = app.RagClient(stub.url + "/search-embed", stub.url + "/search-embed-batch")
+    items = [(f"queued question {i}", None) for i in range(count)]
+    start = time.time()
+    answered = sum(1 for data in client.search_batch(items) if data is not None)
+    elapsed = time.time() - start
+    print(f"▶️ {name}: {answered}/{count} answered in {elapsed:.2f}s with {len(stub.requests)} HTTP requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50, help="requests per phase")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.2, help="stub failure rate in the flaky phase")
+    args = parser.parse_args()
+
+    app.RAG_BREAKER_COOLDOWN = 2
+    stub = start_rag_stub(latency=args.latency)
+    client = app.RagClient(stub.url + "/search-embed")
+
+    run_phase(client, "healthy", args.requests)
+
+    stub.failure_rate = args.failure_rate
+    run_phase(client, "flaky", args.requests)
+
+    stub.failure_rate = 0.0
+    stub.available = False
+    run_phase(client, "down", args.requests)
+
+    stub.available = True
+    time.sleep(app.RAG_BREAKER_COOLDOWN * 1.5)
+    run_phase(client, "recovered", args.requests)
+
+    print(f"📊 Client counters: {client.stats()}")
+    print(f"📨 Stub received {len(stub.requests)} requests")
+
+    start = time.time()
+    for i in range(args.requests):
+        client.search(f"queued question {i}")
+    print(f"▶️ sequential: {args.requests} queued questions in {time.time() - start:.2f}s")
+    run_batch_phase("batch endpoint", True, args.requests, args.latency)
+    run_batch_phase("no batch endpoint, parallel fallback", False, args.requests, args.latency)
+
+
+if __name__ == "__main__":
+    main()
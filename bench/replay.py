@@ -0,0 +1,181 @@
+"""Replay recorded production traces through app.py's Python code paths against local stubs.
+
+Reads the traces app.py writes with TRACE_RECORDING on (one JSON line per
+processed message) and runs each message through detection, thread
+extraction, reply generation and inquiry storage without a browser or
+Alibaba. The recorded thread is served to extract_new_messages() in place
+of the page, RAG and webhook calls go to the local stubs, and all state
+(processed index, reply cache, ledger, outbox) lives in a temp dir.
+
+CPU time (time.process_time, so background threads count too) and
+allocations (tracemalloc) are reported per code path, and the run is
+appended as one JSON line to the output file.
+
+    python bench/replay.py traces.jsonl --speed 20 --label after-change
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from stubs import start_rag_stub, start_webhook_stub
+
+
+class RecordedPage:
+    """Stands in for the driver: answers the thread script with what was recorded"""
+
+    current_url = "about:replay"
+
+    def __init__(self, trace):
+        self.trace = trace
+
+    def execute_script(self, script, *args):
+        return self.trace.get("thread") or {}
+
+
+@contextmanager
+def measured(stats, path):
+    tracemalloc.reset_peak()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    try:
+        yield
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        entry = stats.setdefault(path, {"calls": 0, "cpu_s": 0.0, "wall_s": 0.0, "retained_kb": 0.0, "peak_kb": 0.0})
+        entry["calls"] += 1
+        entry["cpu_s"] += time.process_time() - cpu_before
+        entry["wall_s"] += time.perf_counter() - wall_before
+        entry["retained_kb"] += max(current - memory_before, 0) / 1024
+        entry["peak_kb"] = max(entry["peak_kb"], (peak - memory_before) / 1024)
+
+
+def configure_app(work_dir, rag_stub, webhook_stub):
+    app.ACTIVITY_LOG = os.path.join(work_dir, "activity.log")
+    app.ERROR_LOG = os.path.join(work_dir, "error.log")
+    app.LOG_TO_CONSOLE = False
+    app.setup_logging()
+    app.TRACE_RECORDING = False
+    app.RAG_PREFETCH = False
+    app.PROCESSED_INDEX = app.ProcessedIndex(os.path.join(work_dir, "processed_index.jsonl"))
+    app.RAG_CLIENT = app.RagClient(rag_stub.url + "/search-embed", rag_stub.url + "/search-embed-batch")
+    app.REPLY_CACHE = app.ReplyCache(os.path.join(work_dir, "reply_cache.json"), app.REPLY_CACHE_MAX_ENTRIES, app.REPLY_CACHE_TTL)
+    app.INQUIRY_LEDGER = app.InquiryLedger(os.path.join(work_dir, "inquiries.db"))
+    app.WEBHOOK_OUTBOX = app.WebhookOutbox(os.path.join(work_dir, "outbox.db"), webhook_stub.url + "/webhook")
+    app.WEBHOOK_OUTBOX.start()
+
+
+def replay_trace(trace, stats):
+    recipient = trace["recipient"]
+    row = trace.get("row") or {}
+    page = RecordedPage(trace)
+
+    with measured(stats, "detect"):
+        eligible = app.is_eligible_row(row)
+        app.is_inquiry_text(row.get("preview", ""))
+    if not eligible and row:
+        return False
+
+    with measured(stats, "extract"):
+        messages = app.extract_new_messages(page, recipient)
+        if messages:
+            message_text, img_url = app.thread_query(messages)
+        else:
+            message_text, img_url = (trace.get("rag") or {}).get("query") or "New message", None
+
+    # Never fetch production image URLs: fingerprint them by URL instead
+    if img_url and img_url not in app.IMAGE_FINGERPRINTS:
+        app.IMAGE_FINGERPRINTS[img_url] = hashlib.sha256(img_url.encode("utf-8")).hexdigest()[:32]
+
+    with measured(stats, "reply"):
+        app.generate_reply(None, message_text, img_url)
+        message_id = messages[-1]["id"] if messages else "row:" + app.row_signature(row)
+        app.PROCESSED_INDEX.mark(recipient, message_id, row)
+
+    payload = trace.get("webhook")
+    if payload:
+        profile = {name: payload.get(name, default) for name, (_, _, _, default) in app.PROFILE_FIELDS.items()}
+        with measured(stats, "inquiry"):
+            app.store_inquiry(page, img_url, profile)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("traces", nargs="?", default=app.TRACE_FILE, help="trace file recorded by app.py")
+    parser.add_argument("--speed", type=float, default=0, help="replay N times faster than recorded; 0 = as fast as possible")
+    parser.add_argument("--recorded-latency", action="store_true", help="make the RAG stub answer as slowly as the recorded calls (scaled by --speed)")
+    parser.add_argument("--rag-latency", type=float, default=0.0, help="fixed stub RAG latency in seconds otherwise")
+    parser.add_argument("--label", default="replay", help="name of this run in the output")
+    parser.add_argument("--output", default=os.path.join(app.BASE_DIR, "bench_output.txt"), help="JSONL file results are appended to")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="alibaba-replay-")
+    rag_stub = start_rag_stub(latency=args.rag_latency)
+    webhook_stub = start_webhook_stub()
+    configure_app(work_dir, rag_stub, webhook_stub)
+
+    stats = {}
+    replayed = 0
+    previous_at = None
+    tracemalloc.start()
+    started = time.time()
+    with open(args.traces, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                trace = json.loads(line)
+            except ValueError:
+                continue
+            if args.speed and previous_at is not None:
+                time.sleep(max(trace["t"] - previous_at, 0) / args.speed)
+            previous_at = trace["t"]
+            if args.recorded_latency:
+                recorded = (trace.get("rag") or {}).get("seconds", 0)
+                rag_stub.latency = recorded / args.speed if args.speed else recorded
+            if replay_trace(trace, stats):
+                replayed += 1
+    elapsed = time.time() - started
+    tracemalloc.stop()
+
+    result = {
+        "label": args.label,
+        "ts": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "traces": args.traces,
+        "replayed": replayed,
+        "duration_s": round(elapsed, 2),
+        "messages_per_s": round(replayed / elapsed, 2) if elapsed else None,
+        "rag_requests": len(rag_stub.requests),
+        "paths": {
+            path: {
+                "calls": entry["calls"],
+                "cpu_ms_per_call": round(entry["cpu_s"] / entry["calls"] * 1000, 3),
+                "wall_ms_per_call": round(entry["wall_s"] / entry["calls"] * 1000, 3),
+                "retained_kb_per_call": round(entry["retained_kb"] / entry["calls"], 2),
+                "peak_kb": round(entry["peak_kb"], 2)
+            }
+            for path, entry in stats.items()
+        }
+    }
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result) + "\n")
+
+    print(f"🔁 {result['label']}: replayed {replayed} messages in {elapsed:.1f}s")
+    for path, entry in result["paths"].items():
+        print(
+            f"  {path:<8} {entry['calls']:>5} calls, {entry['cpu_ms_per_call']:.2f} ms CPU/call, "
+            f"{entry['retained_kb_per_call']:.1f} KB retained/call, peak {entry['peak_kb']:.0f} KB"
+        )
+    print(f"📝 Appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Compare page load time and Chrome RSS with and without CDP resource blocking.
+
+By default a synthetic page is served locally: product images, a web font and
+a video, i.e. the kind of resources app.BLOCKED_RESOURCE_PATTERNS drops. Pass
+--url to measure a real page instead (e.g. app.MAIN_URL with a logged-in
+profile via --profile).
+
+    python bench/resource_blocking.py --runs 10
+"""
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from run_bench import chrome_rss_mb
+from stubs import StubHandler
+
+NAVIGATION_TIMING_JS = """
+var nav = performance.getEntriesByType('navigation')[0];
+var resources = performance.getEntriesByType('resource');
+return {
+    load_ms: nav ? nav.loadEventEnd - nav.startTime : null,
+    resources: resources.length,
+    transferred: resources.reduce(function (sum, r) { return sum + (r.transferSize || 0); }, 0)
+};
+"""
+
+
+def png(width, height, seed):
+    """A valid RGB PNG, so Chrome decodes it into a full-size bitmap"""
+    row = bytes((x * seed) % 256 for x in range(width * 3))
+    raw = b"".join(b"\x00" + row for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+class HeavyPageHandler(StubHandler):
+    images = 40
+
+    def do_GET(self):
+        if self.path.startswith("/img/"):
+            body, content_type = png(800, 800, int(self.path.split("/")[-1].split(".")[0]) + 1), "image/png"
+        elif self.path.startswith("/font"):
+            body, content_type = os.urandom(200 * 1024), "font/woff2"
+        elif self.path.startswith("/video"):
+            body, content_type = os.urandom(1024 * 1024), "video/mp4"
+        else:
+            body = (
+                "<!DOCTYPE html><html><head><style>@font-face { font-family: Bench; src: url(/font.woff2); }"
+                "body { font-family: Bench, sans-serif; }</style></head><body>"
+                "<video src='/video.mp4' preload='auto' muted></video>"
+                + "".join(f"<img src='/img/{i}.png' width='200'>" for i in range(self.images))
+                + "</body></html>"
+            ).encode("utf-8")
+            content_type = "text/html"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def measure(url, runs, blocking, profile_dir):
+    app.BLOCK_RESOURCES = blocking
+    driver = app.adopt_browser(app.launch_chrome(profile_dir))
+    try:
+        loads, transferred, rss = [], [], []
+        for _ in range(runs):
+            driver.get(url)
+            app.wait_for_page_load(driver)
+            time.sleep(0.5)  # Let late resources settle before reading the timings
+            timing = driver.execute_script(NAVIGATION_TIMING_JS)
+            if timing["load_ms"] is not None:
+                loads.append(timing["load_ms"])
+            transferred.append(timing["transferred"])
+            sample = chrome_rss_mb()
+            if sample is not None:
+                rss.append(sample)
+    finally:
+        app.retire_browser(driver, app.CHROME_PID)
+    return {
+        "load_ms_p50": sorted(loads)[len(loads) // 2] if loads else None,
+        "transferred_kb_avg": sum(transferred) / len(transferred) / 1024 if transferred else 0,
+        "rss_mb_avg": sum(rss) / len(rss) if rss else None,
+        "rss_mb_max": max(rss) if rss else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="page loads per mode")
+    parser.add_argument("--url", help="page to load instead of the synthetic one")
+    parser.add_argument("--profile", help="Chrome user-data-dir to use, e.g. a logged-in profile")
+    args = parser.parse_args()
+
+    url = args.url
+    if not url:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), HeavyPageHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+    app.DETECTION_MODE = "poll"
+
+    for label, blocking in (("without blocking", False), ("with blocking", True)):
+        result = measure(url, args.runs, blocking, args.profile)
+        load = f"{result['load_ms_p50']:.0f} ms" if result["load_ms_p50"] is not None else "n/a"
+        rss = f"avg {result['rss_mb_avg']:.0f} MB, max {result['rss_mb_max']:.0f} MB" if result["rss_mb_avg"] else "n/a"
+        print(f"🌐 {label}: load p50 {load}, {result['transferred_kb_avg']:.0f} KB transferred, RSS {rss}")
+
+
+if __name__ == "__main__":
+    main()
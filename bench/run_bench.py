@@ -0,0 +1,174 @@
+"""Offline end-to-end benchmark of app.py against a fake OneTalk page, RAG and webhook.
+
+Serves bench/fixtures/onetalk.html plus stub RAG and webhook endpoints on
+localhost, then runs the same detect/drain/wait loop as app.main() in
+headless Chrome for a fixed duration at a configurable message-arrival rate.
+Reports messages/min, p50/p95 reply latency (arrival in the page until the
+reply is sent) and Chrome RSS. Each run is appended as one JSON line to the
+output file so runs can be compared.
+
+    python bench/run_bench.py --rate 20 --duration 300 --label baseline
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from stubs import start_fixture_server, start_rag_stub, start_webhook_stub
+
+
+def configure_app(work_dir, fixtures, rag_stub, webhook_stub, args):
+    """Point app.py's settings and shared components at the local stand-ins"""
+    app.ACTIVITY_LOG = os.path.join(work_dir, "activity.log")
+    app.ERROR_LOG = os.path.join(work_dir, "error.log")
+    app.LOG_TO_CONSOLE = args.verbose
+    app.setup_logging()
+
+    app.BASE_URL = fixtures.url + "/"
+    app.MAIN_URL = (
+        f"{fixtures.url}/onetalk.html?rate={args.rate}&types={args.types}"
+        f"&repeat={args.repeat}&dialog={args.dialog}&history={0 if args.empty_inbox else 1}"
+    )
+    app.COOKIES_FILE = os.path.join(work_dir, "cookies.json")
+    with open(app.COOKIES_FILE, "w") as f:
+        json.dump([], f)
+
+    app.DETECTION_MODE = args.detection
+    app.HUMAN_PACING = not args.no_pacing
+    app.TAB_POOL_SIZE = args.tabs
+    app.METRICS_PORT = None
+    app.METRICS_DUMP_INTERVAL = None
+
+    app.PROCESSED_INDEX = app.ProcessedIndex(os.path.join(work_dir, "processed_index.jsonl"))
+    app.RAG_CLIENT = app.RagClient(rag_stub.url + "/search-embed", rag_stub.url + "/search-embed-batch")
+    app.INQUIRY_LEDGER = app.InquiryLedger(os.path.join(work_dir, "inquiries.db"))
+    app.REPLY_CACHE = app.ReplyCache(os.path.join(work_dir, "reply_cache.json"), app.REPLY_CACHE_MAX_ENTRIES, app.REPLY_CACHE_TTL)
+    app.WEBHOOK_OUTBOX = app.WebhookOutbox(os.path.join(work_dir, "outbox.db"), webhook_stub.url + "/webhook")
+    app.WEBHOOK_OUTBOX.start()
+
+
+def chrome_rss_mb():
+    """Resident memory of our Chrome process and all of its children (renderers, GPU, utility)"""
+    try:
+        browser = psutil.Process(app.CHROME_PID)
+        processes = [browser] + browser.children(recursive=True)
+    except (psutil.NoSuchProcess, TypeError, ValueError):
+        return None
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.NoSuchProcess:
+            continue
+    return total / (1024 * 1024)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def run(args):
+    work_dir = tempfile.mkdtemp(prefix="alibaba-bench-")
+    fixtures = start_fixture_server()
+    rag_stub = start_rag_stub(latency=args.rag_latency)
+    webhook_stub = start_webhook_stub(latency=args.webhook_latency)
+    configure_app(work_dir, fixtures, rag_stub, webhook_stub, args)
+
+    driver = app.start_browser()
+    try:
+        if not app.login(driver):
+            raise RuntimeError("Could not load the fake OneTalk page")
+        app.close_dialogs(driver)
+
+        rss_samples = []
+        started = time.time()
+        deadline = started + args.duration
+        poll_interval = app.POLL_INTERVAL_MIN
+        while time.time() < deadline:
+            busy = app.drain_conversations(driver) > 0
+            rss = chrome_rss_mb()
+            if rss is not None:
+                rss_samples.append(rss)
+            poll_interval = app.next_poll_interval(poll_interval, busy)
+            app.wait_for_new_messages(driver, max(min(poll_interval, deadline - time.time()), 0))
+        elapsed = time.time() - started
+
+        page = driver.execute_script("return window.__bench")
+        # Give the outbox a moment to flush before counting webhook deliveries
+        flush_deadline = time.time() + 10
+        while app.WEBHOOK_OUTBOX.pending_count() and time.time() < flush_deadline:
+            time.sleep(0.2)
+    finally:
+        driver.quit()
+        app.cleanup_our_chrome_process()
+
+    latencies = [reply["latency"] for reply in page["replies"]]
+    return {
+        "label": args.label,
+        "ts": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "rate_per_min": args.rate,
+        "duration_s": round(elapsed, 1),
+        "detection": args.detection,
+        "human_pacing": not args.no_pacing,
+        "tabs": args.tabs,
+        "arrivals": page["arrivals"],
+        "followups": page["followups"],
+        "dialogs": page["dialogs"],
+        "replies": len(latencies),
+        "messages_per_min": round(len(latencies) / elapsed * 60, 2),
+        "latency_p50_s": percentile(latencies, 0.5),
+        "latency_p95_s": percentile(latencies, 0.95),
+        "rss_mb_avg": round(sum(rss_samples) / len(rss_samples), 1) if rss_samples else None,
+        "rss_mb_max": round(max(rss_samples), 1) if rss_samples else None,
+        "rag_requests": len(rag_stub.requests),
+        "webhook_deliveries": len(webhook_stub.requests),
+        "reply_cache": app.REPLY_CACHE.stats(),
+        "stages": {
+            key: value for key, value in app.metrics_snapshot()["histograms"].items()
+            if key.startswith("alibaba_stage_seconds")
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=10, help="buyer messages per minute")
+    parser.add_argument("--duration", type=float, default=120, help="seconds to run")
+    parser.add_argument("--types", default="1,1,60,50,1,61,2000,63,57", help="messageType cycle of arriving messages")
+    parser.add_argument("--detection", choices=["push", "poll"], default=app.DETECTION_MODE)
+    parser.add_argument("--repeat", type=float, default=0.3, help="fraction of messages that are follow-ups from known buyers")
+    parser.add_argument("--dialog", type=float, default=0, help="seconds between modal pop-ups; 0 = only after each page load")
+    parser.add_argument("--empty-inbox", action="store_true", help="start without the already handled history conversations")
+    parser.add_argument("--no-pacing", action="store_true", help="disable human-like pauses")
+    parser.add_argument("--tabs", type=int, default=1, help="conversation tabs worked on in parallel")
+    parser.add_argument("--rag-latency", type=float, default=0.5, help="stub RAG latency in seconds")
+    parser.add_argument("--webhook-latency", type=float, default=0.2, help="stub webhook latency in seconds")
+    parser.add_argument("--label", default="run", help="name of this run in the output")
+    parser.add_argument("--output", default=os.path.join(app.BASE_DIR, "bench_output.txt"), help="JSONL file results are appended to")
+    parser.add_argument("--verbose", action="store_true", help="echo app.py's activity log to the console")
+    args = parser.parse_args()
+
+    result = run(args)
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result) + "\n")
+
+    print(f"📊 {result['label']}: {result['replies']}/{result['arrivals']} replied, {result['messages_per_min']} msg/min")
+    if result["latency_p50_s"] is not None:
+        print(f"⏱️ Reply latency p50 {result['latency_p50_s']:.1f}s, p95 {result['latency_p95_s']:.1f}s")
+    if result["rss_mb_avg"] is not None:
+        print(f"🧠 Chrome RSS avg {result['rss_mb_avg']} MB, max {result['rss_mb_max']} MB")
+    print(f"📝 Appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
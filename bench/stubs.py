@@ -0,0 +1,124 @@
+"""Local stand-ins for the external HTTP services app.py talks to.
+
+Each start_* function launches a ThreadingHTTPServer on a free localhost port
+in a daemon thread and returns it. The server object carries its own knobs
+(latency, failure rate, availability) and request counters, so a harness can
+change behaviour mid-run.
+"""
+import functools
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class StubServer(ThreadingHTTPServer):
+    def __init__(self, handler, latency=0.0, failure_rate=0.0):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.available = True
+        self.batch = True
+        self.lock = threading.Lock()
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def record(self, path, payload):
+        with self.lock:
+            self.requests.append({"path": path, "payload": payload, "at": time.time()})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection pooling is observable
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body or b"null")
+        except ValueError:
+            return None
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def simulate_conditions(self):
+        """Apply the server's latency/failure knobs; returns False if the request should fail"""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if not self.server.available or random.random() < self.server.failure_rate:
+            self.send_json(503, {"error": "stub unavailable"})
+            return False
+        return True
+
+
+class RagHandler(StubHandler):
+    """POST /<any> answers one {"query"}; POST /<any>-batch answers {"items": [...]} when batch is on"""
+
+    def do_POST(self):
+        payload = self.read_json()
+        self.server.record(self.path, payload)
+        if self.path.endswith("-batch"):
+            if not self.server.batch:
+                self.send_json(404, {"error": "no batch endpoint"})
+                return
+            if not self.simulate_conditions():
+                return
+            items = (payload or {}).get("items", [])
+            self.send_json(200, {"results": [{"answer": f"Stub answer for: {item.get('query', '')}"} for item in items]})
+            return
+        if not self.simulate_conditions():
+            return
+        query = (payload or {}).get("query", "")
+        self.send_json(200, {"answer": f"Stub answer for: {query}"})
+
+
+def start_rag_stub(latency=0.0, failure_rate=0.0, batch=True):
+    server = StubServer(RagHandler, latency, failure_rate)
+    server.batch = batch
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class WebhookHandler(StubHandler):
+    def do_POST(self):
+        payload = self.read_json()
+        if not self.simulate_conditions():
+            return
+        self.server.record(self.path, payload)
+        self.send_json(200, {"ok": True})
+
+
+def start_webhook_stub(latency=0.0, failure_rate=0.0):
+    server = StubServer(WebhookHandler, latency, failure_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class QuietFileHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server():
+    """Serve bench/fixtures (the fake OneTalk pages) over HTTP"""
+    handler = functools.partial(QuietFileHandler, directory=FIXTURES_DIR)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server